@@ -72,6 +72,10 @@ class Client {
     let res = await this.client.get('/projects/statement/exists/', {params})
     return res
   }
+  async getStatementStatus({params}) {
+    let res = await this.client.get('/projects/statement/status/', {params})
+    return res
+  }
   async getStatSummary({params}) {
     let res = this.client.get('/projects/summary/', {params})
     return res
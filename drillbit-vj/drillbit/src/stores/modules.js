@@ -579,13 +579,15 @@ export const useStatementStore = defineStore('statementStore', () => {
       for (let [frequency, taskId] of Object.entries(tasks)) {
         taskStatuses.value[sim][frequency] = {}
         taskStatuses.value[sim][frequency]['task_id'] = taskId
-        taskStatuses.value[sim][frequency]['status'] = null
+        // frequencies without a task are resampled on request by the server
+        taskStatuses.value[sim][frequency]['status'] = taskId === null ? 'SUCCESS' : null
       }
     }
   }
   const fetchStatus = () => {
     Object.entries(taskStatuses.value).forEach(([sim, tasks]) => {
       Object.entries(tasks).forEach(([frequency, task]) => {
+        if (task['task_id'] === null) return
         checkTaskComplete(task['task_id'], 2000, (result) => {
           taskStatuses.value[sim][frequency]['status'] = result.state
         })
@@ -631,12 +633,11 @@ export const useStatementStore = defineStore('statementStore', () => {
 
     If overwrite is true, delete the existing statements first; thus response to 1. above will always be false
 
-    The main BLOCK level statement and the summary statement are created synchronously. So, the summary table is
-    fetched immediately after the main monthly statement is created. 
-    
-    The other periods ['H', 'D', 'M', 'Q', 'A'] are all created asynchronously and so a task_id is 
-    returned for each. Completion is monitored by status checks on the task_id. Before the task is 
-    complete, the byAccount data for the period is not available.
+    All statements, including the main BLOCK level statement and the summary statement, are created 
+    asynchronously by one job. A task_id is returned for each period ['H', 'D', 'M', 'Q', 'A'], after
+    which that period is available. Completion is monitored by status checks on the task_id. Before the 
+    task is complete, the byAccount data for the period is not available; the summary table is fetched 
+    once every task is complete.
     */
 
     var objParams = {
@@ -649,8 +650,13 @@ export const useStatementStore = defineStore('statementStore', () => {
         simsByIds: simStore.objects.map((sim) => sim.id)
       })
     }
-    const res = await client.checkStatementExists({params: objParams})
-    if (res.data) {
+    const res = await client.getStatementStatus({params: {
+      environments: [objParams.environment],
+      projects: objParams.projects,
+      frequencies: [objParams.frequency],
+    }})
+    const exists = res.data.every((cell) => ['ready', 'stale'].includes(cell.statements[objParams.frequency]))
+    if (exists) {
       getSummary({params: objParams})
       getByAccount({params: objParams})    
     } else { 
@@ -659,9 +665,18 @@ export const useStatementStore = defineStore('statementStore', () => {
         model: dataModel,
         params
       }).then((result) => {
-        getSummary({params: objParams})
-        initStatus(result.data)
+        initStatus(result.data.tasks)
         fetchStatus()
+        if (allTasksComplete.value) { // created without a job by the server
+          getSummary({params: objParams})
+          return
+        }
+        const stopWatching = watch(allTasksComplete, (complete) => {
+          if (complete) {
+            getSummary({params: objParams})
+            stopWatching()
+          }
+        })
       })
     } 
   }
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+class ByteBudgetLRUCache:
+    """
+    In-process LRU cache bounded by the total size of its values, in bytes.
+
+    Entries older than `ttl` seconds are treated as missing. Each process
+    (gunicorn or celery worker) holds its own instance.
+
+    Parameters
+    ----------
+    max_bytes : int
+        The size budget; least recently used entries are evicted once exceeded
+    ttl : float, optional
+        Seconds an entry stays valid. Default: None, entries never expire.
+    sizeof : callable, optional
+        Returns the size in bytes of a value. Default: `len`
+    """
+    def __init__(self, max_bytes, ttl=None, sizeof=len):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+
+        self._entries = OrderedDict() # key -> (value, size, expires)
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+                self._pop(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return # would evict everything else and still not fit
+
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+            self._entries[key] = (value, size, expires)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def get_or_set(self, key, func):
+        """
+        Returns the cached value for `key`, computing and storing it with `func()` on a miss
+        """
+        value = self.get(key)
+        if value is None:
+            value = func()
+            self.set(key, value)
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'nbytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _pop(self, key):
+        value, size, expires = self._entries.pop(key)
+        self.nbytes -= size
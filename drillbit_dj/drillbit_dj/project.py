@@ -1,6 +1,10 @@
+import hashlib
 import pandas as pd
 
 from django.db import models
+from django.db.models import Count, Max
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
 from rest_framework import serializers
 from rest_framework.response import Response
 from rest_framework.decorators import action
@@ -87,6 +91,56 @@ class ProjectListSerializer(BulkUpdateSerializerMixin, serializers.ListSerialize
 
         return df
 
+def parse_sparse_fields(query_params):
+    """
+    Returns the field names of the comma-separated `fields` query parameter, or None
+    if it is not given, and those of `omit`
+    """
+    def names(param):
+        value = query_params.get(param, None)
+        if value is None:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    return names('fields'), names('omit') or set()
+
+class SparseFieldsSerializerMixin:
+    """
+    Limits the fields of a serializer to a sparse fieldset: those named in `fields`
+    less those in `omit`, given as keyword arguments, in the 'sparse_fields' of the 
+    context (see `SparseFieldsViewSetMixin`), or as the `?fields=` and `?omit=` 
+    query parameters of the request. Only the top-level serializer is limited.
+    """
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sparse_fields = None if fields is None and omit is None else (
+            None if fields is None else set(fields), set(omit or ()),
+        )
+
+    def get_sparse_fields(self):
+        if self._sparse_fields is not None:
+            return self._sparse_fields
+        if 'sparse_fields' in self.context:
+            return self.context['sparse_fields']
+        request = self.context.get('request', None)
+        if request is not None:
+            return parse_sparse_fields(request.query_params)
+        return None, set()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+
+        requested, omitted = self.get_sparse_fields()
+        return {
+            name: field for name, field in fields.items()
+            if (requested is None or name in requested) and name not in omitted
+        }
+
 ### ViewSets ###
 class BulkUpdateViewSetMixin:
     @action(detail=False, methods=['put'], url_path='bulk-update')
@@ -102,4 +156,109 @@ class BulkUpdateViewSetMixin:
             return Response(serializer.data)
         else:
             return Response({'error': 'No data provided.'})
-            
\ No newline at end of file
+            
+
+class NotModified(Exception):
+    pass
+
+class ConditionalGetViewSetMixin:
+    """
+    Answers GET requests with 304 Not Modified when the `If-None-Match` or 
+    `If-Modified-Since` of the client still match, before anything is serialized.
+
+    The ETag and Last-Modified of a response follow from `get_version`, which by 
+    default covers `list` and `retrieve` by the latest `ProjectModel.updated_at` 
+    and the number of rows. Viewsets override it to cover other actions, or more
+    of the data a response depends on.
+    """
+    def get_version(self):
+        """
+        Returns a tuple that changes whenever the response of the current request
+        would, starting with its latest `updated_at`; None if the action is not conditional
+        """
+        if self.action == 'list':
+            queryset = self.filter_queryset(self.get_queryset())
+        elif self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = self.get_queryset().filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        else:
+            return None
+
+        version = queryset.aggregate(updated_at=Max('updated_at'), count=Count('pk'))
+        return (version['updated_at'], version['count'])
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._validators = None
+        if request.method not in ('GET', 'HEAD'):
+            return
+
+        version = self.get_version()
+        if version is None:
+            return
+
+        # the same url is rendered differently by each renderer
+        key = repr((request.accepted_renderer.format, version)).encode()
+        etag = f'"{hashlib.sha1(key).hexdigest()}"'
+        last_modified = version[0].timestamp() if version[0] is not None else None
+        self._validators = etag, last_modified
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            etags = parse_etags(if_none_match)
+            if '*' in etags or etag in etags or f'W/{etag}' in etags:
+                raise NotModified()
+            return
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_modified_since is not None and last_modified is not None and int(last_modified) <= if_modified_since:
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=304)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, '_validators', None)
+        if validators is not None and response.status_code in (200, 304):
+            etag, last_modified = validators
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            response['Cache-Control'] = 'no-cache' # always revalidated
+            # the ETag depends on the renderer negotiated from `Accept`
+            patch_vary_headers(response, ['Accept'])
+        return response
+
+class SparseFieldsViewSetMixin:
+    """
+    Passes the sparse fieldset of the request to the serializer, and defers the
+    `deferrable_fields` of the queryset it leaves out, e.g. large binary or JSON
+    columns; see `SparseFieldsSerializerMixin`.
+
+    `list_fields`, if set, are the fields of `list` responses when `?fields=` is not given.
+    """
+    deferrable_fields = ()
+    list_fields = None
+
+    def get_sparse_fields(self):
+        fields, omit = parse_sparse_fields(self.request.query_params)
+        if fields is None and self.action == 'list' and self.list_fields is not None:
+            fields = set(self.list_fields)
+        return fields, omit
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sparse_fields'] = self.get_sparse_fields()
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields, omit = self.get_sparse_fields()
+        deferred = [
+            name for name in self.deferrable_fields
+            if name in omit or (fields is not None and name not in fields)
+        ]
+        return queryset.defer(*deferred) if deferred else queryset
@@ -0,0 +1,160 @@
+"""
+Binary renderers for numeric endpoints, selected with the `Accept` header; JSON stays the default.
+
+'application/msgpack' needs the optional `msgpack` package and 'application/vnd.apache.arrow.stream'
+the optional `pyarrow` package. `MESSAGEPACK_RENDERER_CLASSES` and `NUMERIC_RENDERER_CLASSES`
+only offer the ones that are installed, so other clients are answered 406 Not Acceptable.
+
+Both are column-wise: lists of records with the same keys are sent as one column per key.
+In MessagePack, lists of floats (with ints and nulls) and float arrays are packed as the
+extension type `FLOAT64_EXT_TYPE`, holding little-endian float64 values with NaN for null.
+"""
+import datetime
+import decimal
+import json
+from importlib.util import find_spec
+
+import numpy as np
+import pandas as pd
+from rest_framework.renderers import BaseRenderer, JSONRenderer, BrowsableAPIRenderer
+
+FLOAT64_EXT_TYPE = 1
+
+def _is_records(value):
+    return (
+        isinstance(value, list) and len(value) > 0
+        and all(isinstance(row, dict) for row in value)
+        and all(row.keys() == value[0].keys() for row in value)
+    )
+
+def _to_columns(records):
+    return {key: [row[key] for row in records] for key in records[0]}
+
+def _float_array(value):
+    """
+    Returns `value` as a float64 array if it is a list of numbers or None with at least one float
+    """
+    if isinstance(value, np.ndarray):
+        return value.astype('<f8') if value.dtype.kind == 'f' else None
+    if not isinstance(value, (list, tuple)) or not value:
+        return None
+
+    has_float = False
+    for item in value:
+        if isinstance(item, (float, np.floating)):
+            has_float = True
+        elif item is not None and (isinstance(item, bool) or not isinstance(item, (int, np.integer))):
+            return None
+    if not has_float:
+        return None
+    return np.array([np.nan if item is None else item for item in value], dtype='<f8')
+
+def _default(obj):
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def pack(self, value):
+        """
+        Prepares `value` for `msgpack`, packing float arrays and turning records into columns
+        """
+        import msgpack
+
+        if isinstance(value, pd.DataFrame):
+            value = {name: value[name].to_numpy() for name in value.columns}
+        elif _is_records(value):
+            value = _to_columns(value)
+        elif isinstance(value, (pd.Index, pd.Series)):
+            value = value.to_numpy()
+
+        array = _float_array(value)
+        if array is not None:
+            if array.ndim > 1:
+                return [msgpack.ExtType(FLOAT64_EXT_TYPE, row.tobytes()) for row in array]
+            return msgpack.ExtType(FLOAT64_EXT_TYPE, array.tobytes())
+
+        if isinstance(value, np.ndarray):
+            value = value.tolist()
+        if isinstance(value, dict):
+            return {key: self.pack(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.pack(item) for item in value]
+        return value
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import msgpack
+
+        if data is None:
+            return b''
+        return msgpack.packb(self.pack(data), default=_default, use_bin_type=True)
+
+class ArrowRenderer(BaseRenderer):
+    """
+    Renders a table as an Arrow IPC stream. The table is a DataFrame, a list of records,
+    or a dict of equal-length columns; in a dict, a single value that is a list of records
+    is the table instead. The other, scalar items of a dict are JSON-encoded in the
+    metadata of the schema.
+    """
+    media_type = 'application/vnd.apache.arrow.stream'
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+
+    def to_table(self, data):
+        import pyarrow as pa
+
+        if isinstance(data, pd.DataFrame):
+            return pa.Table.from_pandas(data, preserve_index=False)
+        if _is_records(data):
+            return pa.Table.from_pylist(data)
+        if not isinstance(data, dict):
+            raise ValueError('Only tables can be rendered as Arrow')
+
+        records = [key for key, value in data.items() if _is_records(value)]
+        if len(records) == 1:
+            columns = _to_columns(data[records[0]])
+            scalars = {key: value for key, value in data.items() if key != records[0]}
+        else:
+            columns, scalars = {}, {}
+            for key, value in data.items():
+                if isinstance(value, (list, tuple, np.ndarray, pd.Index, pd.Series)):
+                    columns[key] = np.asarray(value) if isinstance(value, (pd.Index, pd.Series)) else value
+                else:
+                    scalars[key] = value
+
+        table = pa.table(columns)
+        return table.replace_schema_metadata({
+            key: json.dumps(value, default=_default) for key, value in scalars.items()
+        })
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import pyarrow as pa
+
+        if data is None:
+            return b''
+
+        table = self.to_table(data)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+DEFAULT_RENDERER_CLASSES = [JSONRenderer, BrowsableAPIRenderer]
+MESSAGEPACK_RENDERER_CLASSES = DEFAULT_RENDERER_CLASSES \
+    + ([MessagePackRenderer] if find_spec('msgpack') else [])
+NUMERIC_RENDERER_CLASSES = MESSAGEPACK_RENDERER_CLASSES \
+    + ([ArrowRenderer] if find_spec('pyarrow') else [])
+
+def is_binary(request):
+    return getattr(request, 'accepted_renderer', None) is not None \
+        and request.accepted_renderer.format in (MessagePackRenderer.format, ArrowRenderer.format)
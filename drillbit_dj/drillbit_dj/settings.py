@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -138,6 +139,65 @@ CORS_ALLOWED_ORIGINS = [
 CELERY_BROKER_URL = "redis://localhost:6379"
 CELERY_RESULT_BACKEND = "redis://localhost:6379"
 
+# Drillbit Settings
+# Backend used to encode the env/istat/roi frames of a ProjectStatement
+STATEMENT_STORE = 'projects.storage.ColumnarStatementStore'
+# Block compression of stored statements: 'zstd', 'lz4', 'zlib' or 'raw'. Accounts can
+# override it, and opt into float32, in projects.accounts
+STATEMENT_CODEC = 'zstd' if find_spec('zstandard') else 'zlib'
+
+# Also write statements one row per (account, period) to projects.StatementValue,
+# so single accounts and date windows can be read with an indexed query
+NORMALIZED_STATEMENTS = False
+NORMALIZED_STATEMENT_BATCH_SIZE = 5000
+
+# Frequencies resampled from the block-level statement and saved when it is created.
+# All other frequencies are resampled on first request and held in an in-process cache.
+PERSISTED_FREQUENCIES = ['M']
+STATEMENT_CACHE_MAX_BYTES = 256 * 1024**2
+STATEMENT_CACHE_TTL = 60 * 60 # seconds
+# Chart datasets of accounts compared across projects, cached by the statements they were built from
+CHART_CACHE_MAX_BYTES = 64 * 1024**2
+# Frequencies whose statements also write the chart series of each account, so charts
+# read only the requested accounts; must be persisted to be written
+CHART_FREQUENCIES = PERSISTED_FREQUENCIES
+
+# How statements are created: 'celery' queues a pipeline per simulation; 'processes' simulates
+# in the request across a local pool of STATEMENT_PROCESSES workers (None for one per core)
+STATEMENT_WORKERS = 'celery'
+STATEMENT_PROCESSES = None
+
+# Decoded environments, and their drillbit environment objects, are cached in each process.
+# The drillbit objects cannot be measured, so they are counted as a multiple of the schedules.
+ENVIRONMENT_CACHE_MAX_BYTES = 512 * 1024**2
+ENVIRONMENT_SIZE_FACTOR = 4
+# The encoded environment part of simulation fingerprints, cached by environment version
+FINGERPRINT_CACHE_MAX_BYTES = 64 * 1024**2
+
+# Decoded statements are written here as .npy files and memory-mapped by every worker
+# process on the node; None reads statements from the database on every request.
+# The statements least recently used are removed when the files exceed STATEMENT_DATA_MAX_BYTES.
+STATEMENT_DATA_DIR = BASE_DIR / 'statement_data'
+STATEMENT_DATA_MAX_BYTES = 8 * 1024**3
+
+# Concurrent requests for the same statement wait on a lock held in this Redis while the
+# first computes it; None locks within each process only. The lock expires after
+# STATEMENT_LOCK_TIMEOUT in case its holder dies, and waiters give up after STATEMENT_LOCK_WAIT.
+STATEMENT_LOCK_URL = CELERY_BROKER_URL
+STATEMENT_LOCK_TIMEOUT = 30 * 60 # seconds
+STATEMENT_LOCK_WAIT = 30 * 60 # seconds
+# Statements queued in a celery pipeline are reported in progress until a worker takes
+# their lock, or for at most STATEMENT_QUEUE_TIMEOUT if it never does
+STATEMENT_QUEUE_TIMEOUT = 6 * 60 * 60 # seconds
+
+# Downsampled previews of statement accounts, requested with `?preview=<n>`, are cached
+# per account; n is capped at PREVIEW_MAX_POINTS
+PREVIEW_CACHE_MAX_BYTES = 64 * 1024**2
+PREVIEW_MAX_POINTS = 10000
+
+# Periods encoded at a time when a statement is streamed as JSON
+STATEMENT_STREAM_CHUNK_COLUMNS = 4096
+
 # LOGGING = {
 #    'version': 1,
 #    'disable_existing_loggers': False,
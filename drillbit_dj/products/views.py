@@ -7,19 +7,20 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 
-from drillbit_dj.project import BulkUpdateViewSetMixin
+from drillbit_dj.project import BulkUpdateViewSetMixin, ConditionalGetViewSetMixin
+from drillbit_dj.renderers import MESSAGEPACK_RENDERER_CLASSES, NUMERIC_RENDERER_CLASSES
 from .models import Rig, Cooling, HeatRejection, Electrical, WeatherStation, WeatherData
 from .serializers import RigSerializer, CoolingSerializer, HeatRejectionSerializer, ElectricalSerializer, \
     RejectionCurveForProductSerializer, WeatherStationSerializer, WeatherDataSerializer, \
     RejectionTemperatureImpactSerializer, RejectionTemperaturePaybackSerializer, \
     DryBulbSimulationSerializer
 
-class RigViewSet(BulkUpdateViewSetMixin, viewsets.ModelViewSet):
+class RigViewSet(ConditionalGetViewSetMixin, BulkUpdateViewSetMixin, viewsets.ModelViewSet):
     serializer_class = RigSerializer
     queryset = Rig.objects.all()
     model = Rig
 
-class CoolingViewSet(BulkUpdateViewSetMixin, viewsets.ModelViewSet):
+class CoolingViewSet(ConditionalGetViewSetMixin, BulkUpdateViewSetMixin, viewsets.ModelViewSet):
     serializer_class = CoolingSerializer
     queryset = Cooling.objects.all()
     model = Cooling
@@ -45,6 +46,7 @@ class RejectionTemperaturePaybackView(generics.CreateAPIView):
 
 class RejectionTemperatureImpactView(generics.CreateAPIView):
     serializer_class = RejectionTemperatureImpactSerializer
+    renderer_classes = NUMERIC_RENDERER_CLASSES
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -57,7 +59,7 @@ class ElectricalViewSet(BulkUpdateViewSetMixin, viewsets.ModelViewSet):
     queryset = Electrical.objects.all()
     model = Electrical
 
-class WeatherStationViewSet(viewsets.ModelViewSet):
+class WeatherStationViewSet(ConditionalGetViewSetMixin, viewsets.ModelViewSet):
     serializer_class = WeatherStationSerializer
     queryset = WeatherStation.objects.all()
     model = WeatherStation
@@ -68,6 +70,7 @@ class WeatherDataViewSet(viewsets.ModelViewSet):
     model = WeatherData
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['station', 'type', 'variable', 'period']
+    renderer_classes = MESSAGEPACK_RENDERER_CLASSES
 
     def list(self, request, *args, **kwargs):
         type = request.GET.get('type', None)
@@ -116,7 +119,7 @@ class WeatherDataViewSet(viewsets.ModelViewSet):
         periods = WeatherData.objects.filter(**filter_kwargs).values_list('period', flat=True).distinct()
         return Response(list(periods))
 
-    @action(detail=False, methods=['post'], url_path='dry-bulb-simulation', name='Dry Bulb Simulation')
+    @action(detail=False, methods=['post'], url_path='dry-bulb-simulation', name='Dry Bulb Simulation', renderer_classes=NUMERIC_RENDERER_CLASSES)
     def dry_bulb_simulation(self, request, pk=None):
         """
         request.data should be of form {station: <station_id>}
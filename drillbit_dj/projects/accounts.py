@@ -0,0 +1,54 @@
+"""
+Registry of the statement accounts that need non-default handling.
+
+Accounts are the row labels of the env, istat and roi statements produced by
+`drillbit`. Any account not declared here is summed when resampled, and stored
+as float64 with the store's default codec.
+"""
+from .codecs import CODECS
+
+AGGREGATIONS = ('sum', 'last', 'mean')
+DTYPES = ('float64', 'float32')
+
+class Account:
+    """
+    Parameters
+    ----------
+    name : str
+        The row label of the account in the statement
+    agg : str, optional
+        How the account is aggregated when resampled, one of `AGGREGATIONS`. Default: 'sum'
+    dtype : str, optional
+        The precision the account is stored with, one of `DTYPES`. 'float32' keeps about
+        7 significant digits. Default: 'float64'
+    codec : str, optional
+        How the account is compressed when stored, one of `projects.codecs.CODECS`.
+        Default: None, the `STATEMENT_CODEC` setting
+    """
+    def __init__(self, name, agg='sum', dtype='float64', codec=None):
+        if agg not in AGGREGATIONS:
+            raise ValueError(f'`agg` must be one of {AGGREGATIONS}')
+        if dtype not in DTYPES:
+            raise ValueError(f'`dtype` must be one of {DTYPES}')
+        if codec is not None and codec not in CODECS:
+            raise ValueError(f'`codec` must be one of {CODECS}')
+
+        self.name = name
+        self.agg = agg
+        self.dtype = dtype
+        self.codec = codec
+
+    def __repr__(self):
+        return f'Account({self.name!r}, agg={self.agg!r}, dtype={self.dtype!r}, codec={self.codec!r})'
+
+ACCOUNTS = {account.name: account for account in (
+    Account('Number of Rigs', agg='last'),
+    Account('BTC Value, if held', agg='last'),
+    Account('BTC, if held', agg='last'),
+    Account('Hash Rate', agg='mean'), # technically INCORRECT; should add up all hashes in period, divide by seconds in period
+    Account('Hash Share', agg='mean', dtype='float32'),
+    Account('BTC Mined', dtype='float32'),
+)}
+
+def get_account(name):
+    return ACCOUNTS.get(name) or Account(name)
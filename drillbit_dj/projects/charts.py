@@ -0,0 +1,98 @@
+"""
+Chart.js and table payloads of statements compared across projects.
+"""
+import numpy as np
+import pandas as pd
+
+from .periods import from_epochs
+
+def chart_frame(dfs):
+    """
+    The accounts of the 'env', 'istat' and 'roi' statements of one project as charted, 
+    with missing values as 0; an account in more than one statement is taken from the first
+    """
+    df = pd.concat([df for df in dfs if df is not None]).fillna(0)
+    return df[~df.index.duplicated()]
+
+def account_datasets(frames, names=None):
+    """
+    Builds `{labels, datasets}` with one dataset per project for each account
+
+    Parameters
+    ----------
+    frames : dict of hashable -> pandas.DataFrame
+        The statement of each project, by project, accounts x epoch seconds.
+        Missing values within a project are taken as 0; periods a project does
+        not cover are null.
+    names : dict of hashable -> str, optional
+        The name each project is labelled with; by default, the keys of `frames`
+
+    Returns
+    -------
+    dict with the month labels of the periods, and account -> list of
+    `{label, data}` sorted by project name
+    """
+    names = names or {key: key for key in frames}
+    keys = sorted(frames, key=lambda key: (names[key], str(key)))
+    columns = np.unique(np.concatenate([frames[key].columns.to_numpy(dtype='int64') for key in keys] or [[]])) \
+        .astype('int64')
+    accounts = sorted(set().union(*(frames[key].index for key in keys)))
+
+    # projects x accounts x periods
+    values = np.stack([
+        frames[key].fillna(0).reindex(index=accounts, columns=columns).to_numpy(dtype='float64')
+        for key in keys
+    ]) if keys else np.empty((0, len(accounts), len(columns)))
+    present = np.array([[account in frames[key].index for account in accounts] for key in keys], dtype=bool) \
+        .reshape(len(keys), len(accounts))
+
+    data = values.astype(object)
+    data[np.isnan(values)] = None
+    data = data.tolist()
+
+    return {
+        'labels': from_epochs(columns).strftime('%Y-%m').tolist(),
+        'datasets': {
+            account: [
+                {'label': names[key], 'data': data[p][a]}
+                for p, key in enumerate(keys) if present[p, a]
+            ]
+            for a, account in enumerate(accounts)
+        },
+    }
+
+def sizeof_datasets(payload):
+    """
+    Approximate size in bytes of a payload of `account_datasets`
+    """
+    return 8 * (1 + len(payload['labels'])) * (1 + sum(len(datasets) for datasets in payload['datasets'].values()))
+
+def summary_records(summaries):
+    """
+    Builds the table of the summaries of many projects, one record per summary 
+    item with the value of each project under its name
+
+    Parameters
+    ----------
+    summaries : iterable of (str, dict)
+        The project name and summary of each project, in column order
+
+    Returns
+    -------
+    list of dict, `{'index': item, name: value, ...}` in order of first appearance
+    of the items; missing values are 0
+    """
+    summaries = list(summaries)
+    items = list(dict.fromkeys(item for _, summary in summaries for item in summary))
+    return [
+        {
+            'index': item,
+            **{name: _fill(summary.get(item)) for name, summary in summaries},
+        }
+        for item in items
+    ]
+
+def _fill(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return 0
+    return value
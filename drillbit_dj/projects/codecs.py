@@ -0,0 +1,48 @@
+"""
+Block compression codecs for stored statements.
+
+'zstd' and 'lz4' need the optional `zstandard` and `lz4` packages; they are only
+imported when a statement is written or read with them. 'zlib' is always available.
+"""
+import zlib
+
+CODECS = ('raw', 'zlib', 'lz4', 'zstd')
+
+# zstd level 3 is its default; higher levels are much slower to write for little gain on floats
+ZSTD_LEVEL = 3
+
+def _import(codec):
+    try:
+        if codec == 'zstd':
+            import zstandard
+            return zstandard
+        import lz4.frame
+        return lz4.frame
+    except ImportError as exc:
+        package = 'zstandard' if codec == 'zstd' else 'lz4'
+        raise ImportError(
+            f"The '{codec}' statement codec needs the `{package}` package. "
+            f"Install it, or set `STATEMENT_CODEC` to 'zlib' or 'raw'."
+        ) from exc
+
+def compress(data, codec):
+    if codec == 'raw':
+        return bytes(data)
+    if codec == 'zlib':
+        return zlib.compress(data, 1)
+    if codec == 'zstd':
+        return _import(codec).ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if codec == 'lz4':
+        return _import(codec).compress(data)
+    raise ValueError(f'`codec` must be one of {CODECS}')
+
+def decompress(data, codec):
+    if codec == 'raw':
+        return data
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    if codec == 'zstd':
+        return _import(codec).ZstdDecompressor().decompress(data)
+    if codec == 'lz4':
+        return _import(codec).decompress(data)
+    raise ValueError(f'`codec` must be one of {CODECS}')
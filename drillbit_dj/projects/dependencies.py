@@ -0,0 +1,253 @@
+"""
+Dependency graph of the statement accounts that follow from the financial inputs
+of a `Project`.
+
+Only `INPUTS` are passed to `drillbit` by `Project.as_drillbit_object`; the environment,
+hash share and revenue do not depend on them. When one of them changes, the accounts
+downstream of it are recomputed on top of the stored block-level statement instead
+of rebuilding the statement from scratch.
+
+Each account in `GRAPH` declares its parents and the exact form of the relation,
+including where it is clipped, as taxes are at zero. Only the relations declared
+`fitted` hold up to a constant factor, such as a tax rate, that is fitted on the stored
+statement; the others must hold as declared. The relation must reproduce the stored
+values exactly. If the relation of an affected account does not hold on the stored 
+statement, its factor cannot be determined from it, or the account is not in it,
+`recompute_statements` returns None and the statement must be rebuilt. Accounts
+not declared in `GRAPH` are taken not to depend on `INPUTS`.
+"""
+from graphlib import TopologicalSorter
+
+import numpy as np
+
+from .resample import resample_statement
+
+# Project fields passed to `drillbit`, and the accounts they feed directly
+INPUTS = {
+    'energy_price': 'Energy Expenses',
+    'pool_fees': 'Pool Fees',
+}
+
+KINDS = ('scale', 'linear', 'clipped', 'ratio', 'product', 'cumsum')
+
+class Relation:
+    """
+    Parameters
+    ----------
+    kind : str
+        One of `KINDS`, each times a constant factor
+            'scale': proportional to the project input `field`
+            'linear': the weighted sum of the parents
+            'clipped': the weighted sum of the parents where it is positive, otherwise 0
+            'ratio': the first parent divided by the second
+            'product': the product of the two parents
+            'cumsum': the running total of the weighted sum of the parents
+    parents : tuple of str or dict of str -> float
+        The accounts the account is computed from; a dict gives the weight of
+        each parent of a 'linear' or 'cumsum' relation, otherwise they are 1
+    field : str, optional
+        The project input of a 'scale' relation
+    fitted : bool, optional
+        Whether the constant factor is fitted on the stored statement; otherwise it is 1.
+        Default: False
+    """
+    def __init__(self, kind, parents=(), field=None, fitted=False):
+        if kind not in KINDS:
+            raise ValueError(f'`kind` must be one of {KINDS}')
+        if not isinstance(parents, dict):
+            parents = dict.fromkeys(parents, 1)
+
+        self.kind = kind
+        self.parents = tuple(parents)
+        self.weights = np.array(list(parents.values()), dtype='float64')
+        self.field = field
+        self.fitted = fitted
+
+    def __repr__(self):
+        return f'Relation({self.kind!r}, parents={self.parents!r}, field={self.field!r}, fitted={self.fitted!r})'
+
+# statement -> account -> relation; parents of 'roi' accounts may be monthly 'istat' or 'env' accounts
+GRAPH = {
+    'istat': {
+        'Energy Expenses': Relation('scale', field='energy_price'),
+        'Pool Fees': Relation('scale', field='pool_fees'),
+        'Net Revenue': Relation('linear', {'Gross Revenue': 1, 'Pool Fees': -1}),
+        'Gross Profit': Relation('linear', {'Net Revenue': 1, 'Energy Expenses': -1}),
+        'Gross Margin': Relation('ratio', ('Gross Profit', 'Net Revenue')),
+        'EBITDA': Relation('linear', {'Gross Profit': 1, 'Operating Expenses': -1, 'Property Tax': -1}),
+        'EBIT': Relation('linear', {'EBITDA': 1, 'Rig Amortization': -1, 'Infra Amortization': -1}),
+        # the tax rate times the taxable income, if any
+        'Taxes': Relation('clipped', {'EBITDA': 1, 'Depreciation for Taxes': -1}, fitted=True),
+        'Profit, if sold': Relation('linear', {'EBIT': 1, 'Taxes': -1}),
+        'Cash Expenses': Relation('linear', ('Energy Expenses', 'Operating Expenses', 'Property Tax', 'Taxes')),
+        'Operating Cash Flow, if sold': Relation('linear', {'Net Revenue': 1, 'Cash Expenses': -1}),
+        'BTC Earned': Relation('ratio', ('Net Revenue', 'BTC Price')),
+        'BTC Converted for Expenses': Relation('ratio', ('Cash Expenses', 'BTC Price')),
+        'BTC, if held': Relation('cumsum', {'BTC Earned': 1, 'BTC Converted for Expenses': -1}),
+        'BTC Value, if held': Relation('product', ('BTC, if held', 'BTC Price')),
+    },
+    'roi': {
+        'Operating Cash Flow, sold': Relation('linear', ('Operating Cash Flow, if sold',)),
+        'Operating Cash Flow, held': Relation('linear', ('Operating Cash Flow, if sold', 'BTC Value, if held')),
+        'Net Cash Flow, sold': Relation('linear', ('Operating Cash Flow, sold', 'Cash Outlays')),
+        'Net Cash Flow, held': Relation('linear', ('Operating Cash Flow, held', 'Cash Outlays')),
+        'Cumulative Net, sold': Relation('cumsum', ('Net Cash Flow, sold',)),
+        'Cumulative Net, held': Relation('cumsum', ('Net Cash Flow, held',)),
+        # over the total investment
+        'ROI, sold': Relation('linear', ('Cumulative Net, sold',), fitted=True),
+        'ROI, held': Relation('linear', ('Cumulative Net, held',), fitted=True),
+    },
+}
+
+# relative tolerance within which a fitted relation must reproduce the stored values
+TOLERANCE = 1e-6
+
+def affected_accounts(fields):
+    """
+    Returns the accounts that depend on any of the project `fields`, in the order
+    they must be computed, as (statement, account) pairs
+    """
+    owners = {account: statement for statement, graph in GRAPH.items() for account in graph}
+    affected = {INPUTS[field] for field in fields if field in INPUTS}
+
+    sorter = TopologicalSorter({
+        account: relation.parents
+        for graph in GRAPH.values() for account, relation in graph.items()
+    })
+    ordered = []
+    for account in sorter.static_order():
+        relation = GRAPH.get(owners.get(account), {}).get(account)
+        if relation is not None and affected.intersection(relation.parents):
+            affected.add(account)
+        if account in affected:
+            ordered.append((owners[account], account))
+
+    return ordered
+
+def _terms(relation, get):
+    """
+    The relation of an account without its constant factor, or its increments for 'cumsum'
+    """
+    parents = [get(parent) for parent in relation.parents]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if relation.kind == 'ratio':
+            return parents[0] / parents[1]
+        if relation.kind == 'product':
+            return parents[0] * parents[1]
+    terms = relation.weights @ np.array(parents)
+    return np.maximum(terms, 0) if relation.kind == 'clipped' else terms
+
+def _fit(relation, y, terms):
+    """
+    Fits the constant factor of `relation` to the stored values `y`, or checks that it is 1;
+    None if the relation does not hold or the factor cannot be determined
+    """
+    if relation.kind == 'cumsum':
+        y = np.diff(y, prepend=0)
+
+    valid = np.isfinite(y) & np.isfinite(terms)
+    if relation.kind == 'cumsum' and not valid.all():
+        return None # a running total cannot skip missing values
+    if not valid.any():
+        return None
+
+    y, terms = y[valid], terms[valid]
+    if relation.fitted:
+        norm = terms @ terms
+        if not norm: # e.g. no taxable income, so no tax rate
+            return None
+        factor = (terms @ y) / norm
+    else:
+        factor = 1.0
+    scale = max(1.0, np.abs(y).max())
+    if not np.allclose(factor * terms, y, rtol=TOLERANCE, atol=TOLERANCE * scale):
+        return None
+
+    return factor
+
+def _apply(relation, factor, terms):
+    values = factor * terms
+    return np.cumsum(values) if relation.kind == 'cumsum' else values
+
+def _recompute_account(relation, y, old, new, built_inputs, inputs):
+    """
+    Returns the new values of one account, or None if its relation does not hold
+    """
+    if relation.kind == 'scale':
+        before, after = built_inputs.get(relation.field), inputs.get(relation.field)
+        return y * (after / before) if before else None
+
+    try:
+        factor = _fit(relation, y, _terms(relation, old))
+    except KeyError: # a parent is not in the statement
+        return None
+    if factor is None:
+        return None
+    return _apply(relation, factor, _terms(relation, new))
+
+def _getter(*frames):
+    def get(account):
+        for df in frames:
+            if df is not None and account in df.index:
+                return df.loc[account].to_numpy(dtype='float64')
+        raise KeyError(account)
+    return get
+
+def _monthly(df, columns):
+    monthly = resample_statement(df, ['M'])['M']
+    if not columns.isin(monthly.columns).all():
+        return None
+    return monthly.reindex(columns=columns)
+
+def recompute_statements(frames, built_inputs, inputs):
+    """
+    Recomputes the accounts of a block-level statement affected by changed project inputs
+
+    Parameters
+    ----------
+    frames : dict of str -> pandas.DataFrame
+        The decoded 'env', 'istat' and 'roi' statements, built with `built_inputs`;
+        'roi' may be None
+    built_inputs, inputs : dict of str -> float
+        The values of `INPUTS` the statement was built with, and their new values
+
+    Returns
+    -------
+    dict of str -> pandas.DataFrame of the recomputed statements, or None if the
+    statement must be rebuilt from scratch
+    """
+    changed = [field for field in INPUTS if built_inputs.get(field) != inputs.get(field)]
+    affected = affected_accounts(changed)
+    old = dict(frames)
+    new = {name: None if df is None else df.copy() for name, df in frames.items()}
+
+    # 'istat' accounts never depend on 'roi' accounts, so all of 'istat' is done first
+    for statement in ('istat', 'roi'):
+        accounts = [account for owner, account in affected if owner == statement]
+        if not accounts or old.get(statement) is None:
+            continue
+
+        if statement == 'roi':
+            # the monthly 'roi' statement depends on the other statements resampled to it
+            columns = old['roi'].columns
+            old_monthly = [_monthly(old[name], columns) for name in ('istat', 'env')]
+            if any(df is None for df in old_monthly):
+                return None
+            new_monthly = [_monthly(new['istat'], columns), old_monthly[1]]
+            get_old, get_new = _getter(old['roi'], *old_monthly), _getter(new['roi'], *new_monthly)
+        else:
+            get_old, get_new = _getter(old['istat'], old['env']), _getter(new['istat'], new['env'])
+
+        for account in accounts:
+            if account not in old[statement].index: # not the account `drillbit` writes
+                return None
+            values = _recompute_account(
+                GRAPH[statement][account],
+                old[statement].loc[account].to_numpy(dtype='float64'),
+                get_old, get_new, built_inputs, inputs,
+            )
+            if values is None:
+                return None
+            new[statement].loc[account] = values
+
+    return new
@@ -0,0 +1,171 @@
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+
+from .periods import to_epoch
+
+class StatementDiskCache:
+    """
+    File-backed copies of decoded statements, opened with `numpy.memmap`.
+
+    Every gunicorn and celery worker on a node maps the same files, so a statement
+    is held once in the OS page cache instead of once per process heap, and a slice
+    only touches the pages of the rows and periods it returns.
+
+    Each (sim, frequency, statement) is kept as
+
+        <root>/<sim>/<frequency>/<statement>.<version>.values.npy  accounts x periods, float64
+        <root>/<sim>/<frequency>/<statement>.<version>.periods.npy int64 epoch seconds
+        <root>/<sim>/<frequency>/<statement>.<version>.json        the index; account names
+
+    where `version` changes whenever the statement row is saved. The index is written
+    last, so a statement is only visible once all of its files are complete, and earlier
+    versions are removed once it is.
+
+    With `max_bytes`, the statements least recently read or written are removed after 
+    each write until the files fit; reads mark a statement used by touching its index.
+    """
+    def __init__(self, root, max_bytes=None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def _paths(self, sim_id, frequency, statement, version):
+        base = self.root / str(sim_id) / frequency
+        stem = f'{statement}.{version}'
+        return base, base / f'{stem}.values.npy', base / f'{stem}.periods.npy', base / f'{stem}.json'
+
+    def get(self, sim_id, frequency, statement, version, accounts=None, start=None, end=None):
+        """
+        Returns the requested accounts and inclusive window of periods, or None on a miss
+        """
+        base, values_path, periods_path, index_path = self._paths(sim_id, frequency, statement, version)
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(index_path)
+        except OSError: # removed since, or a read-only cache
+            pass
+
+        mmap_mode = 'r' if index['n_periods'] and index['accounts'] else None # empty files cannot be mapped
+        try:
+            values = np.load(values_path, mmap_mode=mmap_mode)
+            periods = np.load(periods_path, mmap_mode=mmap_mode)
+        except OSError: # removed by another worker since, for a newer version or by `prune`
+            return None
+
+        names = index['accounts']
+        if accounts:
+            rows = [names.index(account) for account in accounts if account in names]
+        else:
+            rows = list(range(len(names)))
+        first = 0 if start is None else int(np.searchsorted(periods, to_epoch(start), 'left'))
+        last = periods.size if end is None else int(np.searchsorted(periods, to_epoch(end), 'right'))
+        last = max(first, last)
+
+        return pd.DataFrame(
+            values[rows, first:last], # copies only the pages of the slice
+            index=[names[i] for i in rows],
+            columns=pd.Index(np.array(periods[first:last])),
+        )
+
+    def accounts(self, sim_id, frequency, statement, version):
+        """
+        Returns the account names of a statement from its index, or None on a miss
+        """
+        *_, index_path = self._paths(sim_id, frequency, statement, version)
+        try:
+            with open(index_path) as f:
+                return json.load(f)['accounts']
+        except FileNotFoundError:
+            return None
+
+    def set(self, sim_id, frequency, statement, version, df):
+        base, values_path, periods_path, index_path = self._paths(sim_id, frequency, statement, version)
+        base.mkdir(parents=True, exist_ok=True)
+
+        self._write(values_path, lambda f: np.save(f, df.to_numpy(dtype='float64')))
+        self._write(periods_path, lambda f: np.save(f, np.asarray(df.columns, dtype='int64')))
+        self._write(index_path, lambda f: f.write(json.dumps({
+            'accounts': [str(account) for account in df.index],
+            'n_periods': len(df.columns),
+        }).encode()))
+
+        # the earlier versions, indexes first so that they are no longer visible
+        for path in sorted(base.glob(f'{statement}.*'), key=lambda path: path.suffix != '.json'):
+            if not path.name.startswith(f'{statement}.{version}.') and path.suffix != '.tmp':
+                path.unlink(missing_ok=True)
+
+        if self.max_bytes is not None:
+            self.prune(self.max_bytes)
+
+    def prune(self, max_bytes):
+        """
+        Removes the statements least recently read or written until the files fit in `max_bytes`
+        """
+        entries, total = [], 0
+        for index_path in self.root.glob('*/*/*.json'):
+            stem = index_path.name[:-len('.json')]
+            paths = [index_path, index_path.with_name(f'{stem}.values.npy'), index_path.with_name(f'{stem}.periods.npy')]
+            try:
+                stats = [path.stat() for path in paths]
+            except FileNotFoundError: # being removed
+                continue
+            size = sum(stat.st_size for stat in stats)
+            entries.append((stats[0].st_mtime, size, paths))
+            total += size
+
+        for _, size, paths in sorted(entries, key=lambda entry: entry[0]):
+            if total <= max_bytes:
+                break
+            for path in paths: # the index first
+                path.unlink(missing_ok=True)
+            total -= size
+
+    def evict(self, sim_id):
+        shutil.rmtree(self.root / str(sim_id), ignore_errors=True)
+
+    @staticmethod
+    def _write(path, write):
+        """
+        Writes through a temporary file in the same directory, so readers in other
+        processes never see a partially written file
+        """
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+def get_disk_cache():
+    """
+    Returns the cache under `settings.STATEMENT_DATA_DIR`, limited to `settings.STATEMENT_DATA_MAX_BYTES`,
+    or None if it is not configured
+    """
+    root = getattr(settings, 'STATEMENT_DATA_DIR', None)
+    return StatementDiskCache(root, getattr(settings, 'STATEMENT_DATA_MAX_BYTES', None)) if root else None
+
+def statement_version(stat):
+    return int(stat.updated_at.timestamp() * 1e6)
+
+def evict_statement_data(sim_ids):
+    """
+    Removes the cached statements of deleted simulations, if the cache is configured
+    """
+    cache = get_disk_cache()
+    if cache is None:
+        return
+    for sim_id in sim_ids:
+        cache.evict(sim_id)
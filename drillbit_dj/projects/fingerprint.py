@@ -0,0 +1,104 @@
+"""
+Content fingerprints of the inputs of a simulation.
+
+Two simulations with the same fingerprint produce the same block-level statement, so
+a statement already computed for one can be copied to the other. The fingerprint
+covers the contents of the environment schedules and everything `Project.as_drillbit_object`
+passes to `drillbit`, but not ids, names or timestamps, so cloned projects and
+re-created environments match.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.forms.models import model_to_dict
+
+from drillbit_dj.cache import ByteBudgetLRUCache
+
+# bump when a change to the simulation makes existing results stale
+FINGERPRINT_VERSION = 1
+
+# the fields of `Project` passed to `drillbit`; the name only labels the project
+PROJECT_FIELDS = ('capacity', 'target_ambient_temp', 'target_overclocking', 'energy_price', 'pool_fees')
+
+def _product(obj):
+    """
+    The fields of a rig or infrastructure product, as passed to `drillbit`
+    """
+    fields = model_to_dict(obj)
+    fields.pop('id', None)
+    fields.pop('name', None)
+    curve = getattr(obj, 'curve', None)
+    if curve is not None: # heat rejection is passed the coefficients of its curve
+        fields['curve'] = (curve.a, curve.b)
+    return fields
+
+def _schedule(schedule):
+    value = schedule.json
+    return json.loads(value) if isinstance(value, str) else value
+
+def _encode(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+
+def environment_inputs(environment):
+    return {
+        'block_schedule': _schedule(environment.block_schedule),
+        'bitcoin_price': _schedule(environment.bitcoin_price),
+        'transaction_fees': _schedule(environment.transaction_fees),
+        'hash_rate': _schedule(environment.hash_rate),
+    }
+
+def environment_version(environment):
+    """
+    The latest `updated_at` of an environment and its schedules
+    """
+    return max(
+        environment.updated_at,
+        environment.block_schedule.updated_at,
+        environment.bitcoin_price.updated_at,
+        environment.transaction_fees.updated_at,
+        environment.hash_rate.updated_at,
+    )
+
+# only the encoded inputs are held, never the environments
+environment_inputs_cache = ByteBudgetLRUCache(settings.FINGERPRINT_CACHE_MAX_BYTES)
+
+def encoded_environment_inputs(environment):
+    """
+    The encoded `environment_inputs`, parsed once per environment and `environment_version`
+    rather than once per simulation
+    """
+    key = (environment.pk, environment_version(environment))
+    return environment_inputs_cache.get_or_set(key, lambda: _encode(environment_inputs(environment)))
+
+def project_inputs(project):
+    rig = project.rigs.select_related('rig').first()
+    return {
+        **{field: getattr(project, field) for field in PROJECT_FIELDS},
+        'rig': None if rig is None else {
+            'product': _product(rig.rig),
+            'quantity': rig.quantity,
+            'price': rig.price,
+        },
+        'infrastructure': [
+            {
+                'type': infra.infra_content_type.model,
+                'product': _product(infra.infrastructure),
+                'quantity': infra.quantity,
+                'price': infra.price,
+            }
+            for infra in project.infrastructure.select_related('infra_content_type')
+        ],
+    }
+
+def simulation_fingerprint(sim, overrides=None):
+    """
+    Returns the sha256 hex digest of the inputs of `sim`, with the project fields
+    in the dict `overrides` taken to have those values instead
+    """
+    project = {**project_inputs(sim.project), **(overrides or {})}
+    # the encoding of {'version', 'environment', 'project'} with sorted keys
+    encoded = '{"environment":%s,"project":%s,"version":%s}' % (
+        encoded_environment_inputs(sim.environment), _encode(project), _encode(FINGERPRINT_VERSION),
+    )
+    return hashlib.sha256(encoded.encode()).hexdigest()
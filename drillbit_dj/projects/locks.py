@@ -0,0 +1,152 @@
+"""
+Single-flight locks around statement computations.
+
+The first caller to compute a statement holds the lock for its key; later callers
+block until it is released, then find the statement already saved. Locks are held
+in Redis at `settings.STATEMENT_LOCK_URL`, so they cover every web and celery worker,
+or in this process only if it is None.
+
+Computations queued for a worker are marked with `queue` in the same place, until 
+their lock is first taken, so they can be reported as in progress before they start.
+"""
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, ExitStack
+
+from django.conf import settings
+
+_local_locks = defaultdict(threading.Lock)
+_local_locks_lock = threading.Lock()
+_local_queued = {} # name -> (value, expires)
+_client = None
+
+def _redis():
+    global _client
+    url = getattr(settings, 'STATEMENT_LOCK_URL', None)
+    if url is None:
+        return None
+    if _client is None:
+        import redis
+        _client = redis.Redis.from_url(url)
+    return _client
+
+def _lock_name(key):
+    return 'drillbit:single-flight:' + ':'.join(str(part) for part in key)
+
+def _queued_name(key):
+    return 'drillbit:queued:' + ':'.join(str(part) for part in key)
+
+@contextmanager
+def single_flight(*key):
+    """
+    Holds the lock for `key` while the block runs; waits up to `STATEMENT_LOCK_WAIT` seconds
+    for another holder to finish
+
+    Raises
+    ------
+    TimeoutError
+        If the lock was not released in time
+    """
+    name = _lock_name(key)
+    wait = settings.STATEMENT_LOCK_WAIT
+    client = _redis()
+
+    if client is None:
+        with _local_locks_lock:
+            lock = _local_locks[name]
+        acquired = lock.acquire(timeout=wait)
+    else:
+        # expires in case its holder dies without releasing it
+        lock = client.lock(name, timeout=settings.STATEMENT_LOCK_TIMEOUT, blocking_timeout=wait)
+        acquired = lock.acquire()
+
+    if not acquired:
+        raise TimeoutError(f'Timed out waiting for the computation of {key}')
+    try:
+        dequeue([key])
+        yield
+    finally:
+        try:
+            lock.release()
+        except Exception: # the lock expired and may have been taken by another caller
+            if client is None:
+                raise
+
+@contextmanager
+def single_flight_many(keys):
+    """
+    Holds the locks of all `keys`, acquired in sorted order so that concurrent
+    callers with overlapping keys cannot deadlock
+    """
+    with ExitStack() as stack:
+        for key in sorted(set(keys), key=lambda key: tuple(str(part) for part in key)):
+            stack.enter_context(single_flight(*key))
+        yield
+
+def held(keys):
+    """
+    Returns those of `keys` whose lock is currently held, in one round trip
+    """
+    keys = list(keys)
+    names = [_lock_name(key) for key in keys]
+    client = _redis()
+    if client is None:
+        with _local_locks_lock:
+            return {key for key, name in zip(keys, names) if name in _local_locks and _local_locks[name].locked()}
+
+    with client.pipeline(transaction=False) as pipe:
+        for name in names:
+            pipe.exists(name)
+        return {key for key, exists in zip(keys, pipe.execute()) if exists}
+
+def queue(values, timeout):
+    """
+    Marks the keys of `values` as queued for computation, each with its value, e.g. 
+    the id of the task that computes it, until their lock is first taken, they are
+    `dequeue`d, or `timeout` seconds pass
+    """
+    names = {_queued_name(key): str(value) for key, value in values.items()}
+    if not names:
+        return
+    client = _redis()
+    if client is None:
+        expires = time.monotonic() + timeout
+        with _local_locks_lock:
+            _local_queued.update((name, (value, expires)) for name, value in names.items())
+        return
+
+    with client.pipeline(transaction=False) as pipe:
+        for name, value in names.items():
+            pipe.set(name, value, ex=timeout)
+        pipe.execute()
+
+def dequeue(keys):
+    names = [_queued_name(key) for key in keys]
+    if not names:
+        return
+    client = _redis()
+    if client is None:
+        with _local_locks_lock:
+            for name in names:
+                _local_queued.pop(name, None)
+        return
+
+    client.delete(*names)
+
+def queued(keys):
+    """
+    Returns those of `keys` that are queued for computation, in one round trip
+    """
+    keys = list(keys)
+    names = [_queued_name(key) for key in keys]
+    client = _redis()
+    if client is None:
+        now = time.monotonic()
+        with _local_locks_lock:
+            return {key for key, name in zip(keys, names) if name in _local_queued and _local_queued[name][1] > now}
+
+    with client.pipeline(transaction=False) as pipe:
+        for name in names:
+            pipe.exists(name)
+        return {key for key, exists in zip(keys, pipe.execute()) if exists}
@@ -0,0 +1,116 @@
+import io
+import json
+import numpy as np
+import pandas as pd
+
+from django.db import migrations, models
+
+STATEMENT_FIELDS = ('env', 'istat', 'roi')
+
+# The `.npz` layout written by this migration; later migrations convert it, so
+# it must not follow changes to `projects.storage`
+def encode(df):
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        values=df.to_numpy(dtype='float64'),
+        index=np.asarray(df.index, dtype=str),
+        columns=np.asarray(df.columns, dtype=str),
+    )
+    return buffer.getvalue()
+
+def decode(blob):
+    with np.load(io.BytesIO(bytes(blob))) as npz:
+        return pd.DataFrame(
+            npz['values'],
+            index=npz['index'].tolist(),
+            columns=npz['columns'].tolist(),
+        )
+
+def json_to_binary(apps, schema_editor):
+    ProjectStatement = apps.get_model('projects', 'ProjectStatement')
+
+    for stat in ProjectStatement.objects.all().iterator():
+        for name in STATEMENT_FIELDS:
+            value = getattr(stat, name)
+            if value is None:
+                continue
+            if isinstance(value, str):
+                value = json.loads(value)
+            setattr(stat, f'{name}_data', encode(pd.DataFrame(value)))
+
+        stat.save(update_fields=[f'{name}_data' for name in STATEMENT_FIELDS])
+
+def binary_to_json(apps, schema_editor):
+    ProjectStatement = apps.get_model('projects', 'ProjectStatement')
+
+    for stat in ProjectStatement.objects.all().iterator():
+        for name in STATEMENT_FIELDS:
+            value = getattr(stat, f'{name}_data')
+            if value is None:
+                continue
+            setattr(stat, name, decode(value).to_json())
+
+        stat.save(update_fields=list(STATEMENT_FIELDS))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0039_alter_project_ambient_temp_source_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectstatement',
+            name='env_data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='projectstatement',
+            name='istat_data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='projectstatement',
+            name='roi_data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        migrations.RemoveField(
+            model_name='projectstatement',
+            name='env',
+        ),
+        migrations.RemoveField(
+            model_name='projectstatement',
+            name='istat',
+        ),
+        migrations.RemoveField(
+            model_name='projectstatement',
+            name='roi',
+        ),
+        migrations.RenameField(
+            model_name='projectstatement',
+            old_name='env_data',
+            new_name='env',
+        ),
+        migrations.RenameField(
+            model_name='projectstatement',
+            old_name='istat_data',
+            new_name='istat',
+        ),
+        migrations.RenameField(
+            model_name='projectstatement',
+            old_name='roi_data',
+            new_name='roi',
+        ),
+        migrations.AlterField(
+            model_name='projectstatement',
+            name='env',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.AlterField(
+            model_name='projectstatement',
+            name='istat',
+            field=models.BinaryField(default=bytes),
+        ),
+    ]
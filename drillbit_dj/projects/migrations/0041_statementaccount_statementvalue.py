@@ -0,0 +1,38 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0040_projectstatement_binary_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatementAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('statement', models.CharField(choices=[('env', 'Environment'), ('istat', 'Income Statement'), ('roi', 'ROI')], max_length=10, verbose_name='Statement')),
+                ('name', models.CharField(max_length=100, verbose_name='Name')),
+            ],
+            options={
+                'unique_together': {('statement', 'name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StatementValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField(verbose_name='Period Start')),
+                ('value', models.FloatField(null=True, verbose_name='Value')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='projects.statementaccount')),
+                ('statement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='values', to='projects.projectstatement')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['statement', 'account', 'period_start'], name='statementvalue_lookup_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,85 @@
+import io
+import numpy as np
+import pandas as pd
+
+from django.db import migrations
+
+STATEMENT_FIELDS = ('env', 'istat', 'roi')
+
+# The column labels of each frequency as stored before this migration; frozen
+# here, as `projects.periods` may change after it
+LABEL_FORMATS = {
+    '10T': '%d-%m-%y %H:%M',
+    'H': '%Y-%m-%d %HH',
+    'D': '%Y-%m-%d',
+    'M': '%Y-%m-%d',
+    'Q': '%Y-%m-%d',
+    'A': '%Y-%m-%d',
+}
+BLOCK_ROI_LABEL_FORMAT = '%Y-%m'
+END_LABELLED_FREQUENCIES = ('M', 'Q', 'A')
+
+def label_format(frequency, statement):
+    if frequency == '10T' and statement == 'roi':
+        return BLOCK_ROI_LABEL_FORMAT
+    return LABEL_FORMATS[frequency]
+
+def parse_labels(labels, frequency, statement):
+    starts = pd.to_datetime(labels, format=label_format(frequency, statement))
+    if frequency in END_LABELLED_FREQUENCIES:
+        starts = starts.to_period(frequency).start_time
+    return pd.DatetimeIndex(starts).values.astype('datetime64[s]').astype('int64')
+
+def format_epochs(epochs, frequency, statement):
+    starts = pd.DatetimeIndex(np.asarray(epochs, dtype='int64').astype('datetime64[s]'))
+    if frequency in END_LABELLED_FREQUENCIES:
+        starts = starts.to_period(frequency).end_time.normalize()
+    return starts.strftime(label_format(frequency, statement))
+
+def load(blob):
+    with np.load(io.BytesIO(bytes(blob))) as npz:
+        return {name: npz[name] for name in npz.files}
+
+def save(**arrays):
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+def convert(apps, to_epoch):
+    """
+    Swaps the string `columns` array of each stored statement for int64 epoch `periods`,
+    or back
+    """
+    ProjectStatement = apps.get_model('projects', 'ProjectStatement')
+
+    for stat in ProjectStatement.objects.all().iterator():
+        for name in STATEMENT_FIELDS:
+            blob = getattr(stat, name)
+            if blob is None:
+                continue
+
+            arrays = load(blob)
+            if to_epoch and 'columns' in arrays:
+                arrays['periods'] = parse_labels(arrays.pop('columns'), stat.frequency, name)
+            elif not to_epoch and 'periods' in arrays:
+                labels = format_epochs(arrays.pop('periods'), stat.frequency, name)
+                arrays['columns'] = np.asarray(labels, dtype=str)
+            setattr(stat, name, save(**arrays))
+
+        stat.save(update_fields=list(STATEMENT_FIELDS))
+
+def labels_to_epochs(apps, schema_editor):
+    convert(apps, to_epoch=True)
+
+def epochs_to_labels(apps, schema_editor):
+    convert(apps, to_epoch=False)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0041_statementaccount_statementvalue'),
+    ]
+
+    operations = [
+        migrations.RunPython(labels_to_epochs, epochs_to_labels),
+    ]
@@ -0,0 +1,95 @@
+import io
+import json
+import struct
+import numpy as np
+import pandas as pd
+
+from django.db import migrations
+
+STATEMENT_FIELDS = ('env', 'istat', 'roi')
+
+# The `.npz` layout with epoch periods written by 0042
+def npz_encode(df):
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        values=df.to_numpy(dtype='float64'),
+        index=np.asarray(df.index, dtype=str),
+        periods=np.asarray(df.columns, dtype='int64'),
+    )
+    return buffer.getvalue()
+
+def npz_decode(blob):
+    with np.load(io.BytesIO(bytes(blob))) as npz:
+        return pd.DataFrame(
+            npz['values'],
+            index=npz['index'].tolist(),
+            columns=pd.Index(npz['periods']),
+        )
+
+# The columnar layout as written by this migration, with raw float64 rows; 
+# see `projects.storage.ColumnarStatementStore`, which still reads it
+COLUMNAR_MAGIC = b'DBSTAT01'
+COLUMNAR_PREFIX = struct.Struct('<8sI')
+
+def columnar_encode(df):
+    periods = np.asarray(df.columns, dtype='int64')
+    steps = np.diff(periods)
+    values = df.to_numpy(dtype='<f8')
+    header = json.dumps({
+        'accounts': [str(account) for account in df.index],
+        'n_periods': int(periods.size),
+        'start': int(periods[0]) if periods.size else None,
+        'step': int(steps[0]) if steps.size and (steps == steps[0]).all() else None,
+        'rows': [{'offset': periods.nbytes + i * values.shape[1] * 8, 'dtype': '<f8'} for i in range(len(df.index))],
+    }).encode()
+    return b''.join([COLUMNAR_PREFIX.pack(COLUMNAR_MAGIC, len(header)), header, periods.tobytes(), values.tobytes()])
+
+def columnar_decode(blob):
+    blob = bytes(blob)
+    _, length = COLUMNAR_PREFIX.unpack_from(blob)
+    data_start = COLUMNAR_PREFIX.size + length
+    header = json.loads(blob[COLUMNAR_PREFIX.size:data_start])
+
+    n = header['n_periods']
+    values = np.empty((len(header['accounts']), n))
+    for i, row in enumerate(header['rows']):
+        if row.get('codec', 'raw') != 'raw':
+            raise ValueError('Compressed statements must be decompressed before reverting this migration')
+        values[i] = np.frombuffer(blob, dtype=row['dtype'], count=n, offset=data_start + row['offset'])
+
+    periods = np.frombuffer(blob, dtype='int64', count=n, offset=data_start)
+    return pd.DataFrame(values, index=header['accounts'], columns=pd.Index(periods))
+
+def convert(apps, to_columnar):
+    ProjectStatement = apps.get_model('projects', 'ProjectStatement')
+
+    for stat in ProjectStatement.objects.all().iterator():
+        for name in STATEMENT_FIELDS:
+            blob = getattr(stat, name)
+            if blob is None:
+                continue
+
+            is_columnar = bytes(blob[:len(COLUMNAR_MAGIC)]) == COLUMNAR_MAGIC
+            if to_columnar and not is_columnar:
+                setattr(stat, name, columnar_encode(npz_decode(blob)))
+            elif not to_columnar and is_columnar:
+                setattr(stat, name, npz_encode(columnar_decode(blob)))
+
+        stat.save(update_fields=list(STATEMENT_FIELDS))
+
+def npz_to_columnar(apps, schema_editor):
+    convert(apps, to_columnar=True)
+
+def columnar_to_npz(apps, schema_editor):
+    convert(apps, to_columnar=False)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0042_projectstatement_epoch_periods'),
+    ]
+
+    operations = [
+        migrations.RunPython(npz_to_columnar, columnar_to_npz),
+    ]
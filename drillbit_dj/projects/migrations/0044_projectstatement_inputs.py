@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0043_projectstatement_columnar_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectstatement',
+            name='inputs',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+def delete_duplicate_statements(apps, schema_editor):
+    """
+    Keeps the most recently updated statement of each simulation and frequency,
+    and summary of each simulation
+    """
+    for name, fields in (('ProjectStatement', ('sim_id', 'frequency')), ('ProjectStatementSummary', ('sim_id',))):
+        model = apps.get_model('projects', name)
+        seen = set()
+        duplicates = []
+        for pk, *key in model.objects.order_by('-updated_at', '-pk').values_list('pk', *fields):
+            if tuple(key) in seen:
+                duplicates.append(pk)
+            seen.add(tuple(key))
+        model.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0045_projectstatement_fingerprint'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_statements, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='projectstatement',
+            unique_together={('sim', 'frequency')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='projectstatementsummary',
+            unique_together={('sim',)},
+        ),
+    ]
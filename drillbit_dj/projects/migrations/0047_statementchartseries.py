@@ -0,0 +1,24 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0046_unique_statements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatementChartSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(max_length=100, verbose_name='Account')),
+                ('data', models.BinaryField()),
+                ('statement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chart_series', to='projects.projectstatement')),
+            ],
+            options={
+                'unique_together': {('statement', 'account')},
+            },
+        ),
+    ]
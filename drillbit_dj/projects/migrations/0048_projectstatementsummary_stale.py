@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0047_statementchartseries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectstatementsummary',
+            name='stale',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,3 +1,7 @@
+from itertools import islice
+
+import pandas as pd
+
 from django.db import models
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
@@ -6,6 +10,7 @@ from drillbit.__new_objects import RigOperator, CoolingOperator, HeatRejectionOp
     ElectricalOperator, Project as ProjectManager
 
 from drillbit_dj.project import ProjectModel
+from .periods import to_epochs, from_epochs
 from products.models import Rig, Cooling, HeatRejection, Electrical, WeatherStation
 from environment.models import Environment
 
@@ -161,13 +166,143 @@ class ProjectStatement(ProjectModel):
     sim = models.ForeignKey(ProjectSimulation, on_delete=models.PROTECT)
     frequency = models.CharField('Frequency', max_length=10, choices=FREQUENCY_CHOICES)
 
-    env = models.JSONField(default=dict)
-    istat = models.JSONField(default=dict)
-    roi = models.JSONField(default=dict, null=True)
+    # encoded by the store named in settings.STATEMENT_STORE; see projects.storage
+    env = models.BinaryField(default=bytes)
+    istat = models.BinaryField(default=bytes)
+    roi = models.BinaryField(null=True)
+
+    # the values of projects.dependencies.INPUTS a block-level statement was built with
+    inputs = models.JSONField(default=dict)
+    # hash of everything the block-level statement was computed from; see projects.fingerprint
+    fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
+
+    class Meta:
+        unique_together = ('sim', 'frequency')
+
+STATEMENT_CHOICES = (
+    ('env', 'Environment'),
+    ('istat', 'Income Statement'),
+    ('roi', 'ROI'),
+)
+class StatementAccount(ProjectModel):
+    statement = models.CharField('Statement', max_length=10, choices=STATEMENT_CHOICES)
+    name = models.CharField('Name', max_length=100)
+
+    class Meta:
+        unique_together = ('statement', 'name')
+
+class StatementValueManager(models.Manager):
+    def bulk_write(self, stat, statement, df, batch_size=5000):
+        """
+        Writes a wide statement frame (accounts x periods) as one row per account and period
+
+        Parameters
+        ----------
+        stat : ProjectStatement
+            The saved statement the values belong to
+        statement : str
+            The name of the statement, i.e. 'env', 'istat' or 'roi'
+        df : pandas.DataFrame
+            The statement with account names on the index and epoch seconds on the columns
+        batch_size : int, optional
+            Number of rows inserted per query; only one batch of instances is built at a time
+
+        Returns
+        -------
+        int, the number of rows written
+        """
+        starts = from_epochs(df.columns).tz_localize('UTC')
+        accounts = {
+            name: StatementAccount.objects.get_or_create(statement=statement, name=name)[0]
+            for name in df.index
+        }
+        rows = (
+            self.model(statement=stat, account=accounts[name], period_start=start, value=value)
+            for name, values in zip(df.index, df.to_numpy(dtype='float64'))
+            for start, value in zip(starts, values.tolist())
+        )
+        # `bulk_create` builds a list of everything it is given
+        written = 0
+        while batch := list(islice(rows, batch_size)):
+            self.bulk_create(batch, batch_size=batch_size)
+            written += len(batch)
+        return written
+
+    def to_frame(self, sim, frequency, statement, accounts=None, start=None, end=None):
+        """
+        Reads values back into a wide statement frame, touching only the requested 
+        accounts and period window through the (statement, account, period_start) index.
+
+        `start` and `end` are inclusive and compared against the period start.
+        """
+        filters = {
+            'statement__sim': sim,
+            'statement__frequency': frequency,
+            'account__statement': statement,
+        }
+        if accounts:
+            filters['account__name__in'] = accounts
+        if start is not None:
+            filters['period_start__gte'] = start
+        if end is not None:
+            filters['period_start__lte'] = end
+
+        values = self.filter(**filters) \
+            .order_by('account_id', 'period_start') \
+            .values_list('account__name', 'period_start', 'value')
+        values = pd.DataFrame(values, columns=['account', 'period_start', 'value'])
+        if values.empty:
+            return pd.DataFrame()
+
+        df = values.pivot(index='account', columns='period_start', values='value') \
+            .reindex(values.account.unique()) # keep accounts in the order they were written
+        df.columns = pd.Index(to_epochs(df.columns.tz_convert(None)))
+        df.index.name = None
+        df.columns.name = None
+
+        return df
+
+class StatementValue(models.Model):
+    """
+    Optional normalized copy of a statement; one row per account and period.
+
+    Does not inherit `ProjectModel` on purpose; timestamps would double the row size.
+    """
+    objects = StatementValueManager()
+
+    statement = models.ForeignKey(ProjectStatement, on_delete=models.CASCADE, related_name='values')
+    account = models.ForeignKey(StatementAccount, on_delete=models.PROTECT)
+    period_start = models.DateTimeField('Period Start')
+    value = models.FloatField('Value', null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['statement', 'account', 'period_start'], name='statementvalue_lookup_idx'),
+        ]
+
+class StatementChartSeries(models.Model):
+    """
+    One account of a saved statement as charted by `projects_by_account`, written 
+    with the statement at the frequencies in `settings.CHART_FREQUENCIES`.
+
+    Does not inherit `ProjectModel`; rows are rewritten with their statement.
+    """
+    statement = models.ForeignKey(ProjectStatement, on_delete=models.CASCADE, related_name='chart_series')
+    account = models.CharField('Account', max_length=100)
+    # a single-account statement encoded by settings.STATEMENT_STORE
+    data = models.BinaryField()
+
+    class Meta:
+        unique_together = ('statement', 'account')
 
 class ProjectStatementSummary(ProjectModel):
     sim = models.ForeignKey(ProjectSimulation, on_delete=models.PROTECT)
     summary = models.JSONField(default=dict)
+    # the block-level statement was updated incrementally since the summary was computed
+    stale = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('sim',)
 
 class Projects(ProjectModel):
     name = models.CharField('Name', max_length=100)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+# Statements are stored and processed with int64 epoch seconds of the start of each
+# period as columns; labels are only formatted for the periods returned in a response.
+
+# Column label formats returned for each statement frequency. The ROI statement
+# of a block-level ('10T') statement is natively monthly and uses its own format.
+LABEL_FORMATS = {
+    '10T': '%d-%m-%y %H:%M',
+    'H': '%Y-%m-%d %HH',
+    'D': '%Y-%m-%d',
+    'M': '%Y-%m-%d',
+    'Q': '%Y-%m-%d',
+    'A': '%Y-%m-%d',
+}
+BLOCK_ROI_LABEL_FORMAT = '%Y-%m'
+
+# Resampled statements are labelled by the last day of the period for these frequencies
+END_LABELLED_FREQUENCIES = ('M', 'Q', 'A')
+
+def label_format(frequency, statement=None):
+    if frequency == '10T' and statement == 'roi':
+        return BLOCK_ROI_LABEL_FORMAT
+    return LABEL_FORMATS[frequency]
+
+def labels_to_period_starts(labels, frequency, statement=None):
+    """
+    Converts statement column labels into the timestamps at which each period starts
+
+    Parameters
+    ----------
+    labels : list-like of str
+        The column labels of a stored statement
+    frequency : str
+        The frequency of the statement, one of `FREQUENCY_CHOICES`
+    statement : str, optional
+        The name of the statement, i.e. 'env', 'istat' or 'roi'
+
+    Returns
+    -------
+    pandas.DatetimeIndex
+    """
+    starts = pd.to_datetime(labels, format=label_format(frequency, statement))
+    if frequency in END_LABELLED_FREQUENCIES:
+        starts = starts.to_period(frequency).start_time
+
+    return starts
+
+def period_starts_to_labels(starts, frequency, statement=None):
+    """
+    Inverse of `labels_to_period_starts`
+    """
+    starts = pd.DatetimeIndex(starts)
+    if frequency in END_LABELLED_FREQUENCIES:
+        starts = starts.to_period(frequency).end_time.normalize()
+
+    return starts.strftime(label_format(frequency, statement))
+
+def to_epochs(starts):
+    """
+    Converts period start timestamps into int64 epoch seconds
+    """
+    return pd.DatetimeIndex(starts).values.astype('datetime64[s]').astype('int64')
+
+def to_epoch(value):
+    """
+    Converts a single timestamp, date string or epoch second into epoch seconds
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(pd.Timestamp(value).value // 10**9)
+
+def from_epochs(epochs):
+    return pd.DatetimeIndex(np.asarray(epochs, dtype='int64').astype('datetime64[s]'))
+
+def format_labels(epochs, frequency, statement=None):
+    """
+    Formats the epoch columns of a statement into the labels of its frequency
+    """
+    return period_starts_to_labels(from_epochs(epochs), frequency, statement)
@@ -0,0 +1,86 @@
+"""
+Downsampled previews of long statements for interactive charts.
+
+Accounts are downsampled with largest-triangle-three-buckets (LTTB), which keeps
+the points that shape the line: the first and last periods, and in each bucket
+between them the point forming the largest triangle with the point kept from the
+previous bucket and the average of the next. All accounts are downsampled at once,
+each bucket in a single vectorized step.
+"""
+import numpy as np
+
+def lttb(x, y, n):
+    """
+    Selects `n` points of each series with largest-triangle-three-buckets
+
+    Parameters
+    ----------
+    x : numpy.ndarray, shape (N,)
+        The increasing positions of the points, e.g. epoch seconds
+    y : numpy.ndarray, shape (A, N)
+        The values of each of A series; NaNs are never preferred
+    n : int
+        The number of points to keep, at least 3
+
+    Returns
+    -------
+    numpy.ndarray of int, shape (A, min(n, N)), the indices kept of each series
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    n_series, n_points = y.shape
+    if n >= n_points:
+        return np.broadcast_to(np.arange(n_points), (n_series, n_points))
+    if n < 3:
+        raise ValueError('`n` must be at least 3')
+
+    # n - 2 buckets between the first and last points
+    edges = np.linspace(1, n_points - 1, n - 1).astype('int64')
+    starts = edges[:-1]
+
+    # the average of each bucket, the third point of the triangles of the bucket before it
+    interior = y[:, :-1] # the last segment of `reduceat` runs to the end
+    missing = np.isnan(interior)
+    counts = np.add.reduceat(~missing, starts, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_y = np.add.reduceat(np.where(missing, 0, interior), starts, axis=1) / counts
+    avg_x = np.add.reduceat(x[:-1], starts) / np.diff(edges)
+    avg_y = np.concatenate([avg_y[:, 1:], y[:, -1:]], axis=1)
+    avg_x = np.append(avg_x[1:], x[-1])
+
+    selected = np.empty((n_series, n), dtype='int64')
+    selected[:, 0] = 0
+    selected[:, -1] = n_points - 1
+    rows = np.arange(n_series)
+    for i, (lo, hi) in enumerate(zip(edges[:-1], edges[1:])):
+        a = selected[:, i]
+        ax, ay = x[a][:, None], y[rows, a][:, None]
+        bx, by = avg_x[i], avg_y[:, i][:, None]
+        # twice the area of the triangle of the previous point, each candidate and the next average
+        area = np.abs((ax - bx) * (y[:, lo:hi] - ay) - (ax - x[lo:hi]) * (by - ay))
+        area[np.isnan(area)] = -1
+        selected[:, i + 1] = lo + area.argmax(axis=1)
+
+    return selected
+
+def preview_statement(df, n):
+    """
+    Downsamples each account of a statement to `n` periods
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        A decoded statement, accounts x epoch seconds
+    n : int
+
+    Returns
+    -------
+    dict of account -> (numpy.ndarray of the epoch seconds, numpy.ndarray of the values) kept
+    """
+    epochs = df.columns.to_numpy(dtype='int64')
+    values = df.to_numpy(dtype='float64')
+    selected = lttb(epochs, values, n)
+    return {
+        account: (epochs[index], row[index])
+        for account, row, index in zip(df.index, values, selected)
+    }
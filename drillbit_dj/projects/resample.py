@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+from .accounts import get_account
+
+# Resample frequencies from finest to coarsest; each one can be built from any finer one
+CASCADE = ('H', 'D', 'M', 'Q', 'A')
+
+# numpy datetime unit of each frequency, and the number of units in one period
+PERIOD_UNITS = {
+    'H': ('h', 1),
+    'D': ('D', 1),
+    'M': ('M', 1),
+    'Q': ('M', 3),
+    'A': ('Y', 1),
+}
+
+def period_boundaries(starts, frequency):
+    """
+    Groups sorted timestamps into the periods of `frequency`
+
+    Parameters
+    ----------
+    starts : numpy.ndarray of datetime64
+        Sorted timestamps at which each source period starts
+    frequency : str
+        The target frequency, one of `CASCADE`
+
+    Returns
+    -------
+    bounds : numpy.ndarray of int
+        Index of the first timestamp in each non-empty target period
+    positions : numpy.ndarray of int
+        Position of each non-empty target period in the full, gapless target range
+    period_starts : numpy.ndarray of datetime64[s]
+        Start of every period in the full target range
+    """
+    unit, step = PERIOD_UNITS[frequency]
+    keys = starts.astype(f'datetime64[{unit}]').astype('int64')
+    keys -= keys % step # months since 1970-01 are aligned with quarters
+
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    positions = (keys[bounds] - keys[0]) // step
+    period_starts = np.arange(keys[0], keys[-1] + 1, step) \
+        .astype(f'datetime64[{unit}]') \
+        .astype('datetime64[s]')
+
+    return bounds, positions, period_starts
+
+def _scatter(values, positions, size, fill):
+    """
+    Places per-period results into the full target range, filling empty periods
+    """
+    if values.shape[1] == size:
+        return values
+    out = np.full((values.shape[0], size), fill, dtype=values.dtype)
+    out[:, positions] = values
+    return out
+
+def _reduce_last(values, bounds):
+    """
+    Last non-NaN value of each row within each group starting at `bounds`; NaN if none
+    """
+    n = values.shape[1]
+    seen = np.maximum.accumulate(np.where(np.isnan(values), -1, np.arange(n)), axis=1)
+    index = seen[:, np.append(bounds[1:], n) - 1]
+
+    out = np.take_along_axis(values, np.maximum(index, 0), axis=1)
+    out[index < bounds] = np.nan
+    return out
+
+def resample_statement(df, frequencies):
+    """
+    Resamples a block-level statement to several frequencies in a single pass.
+
+    All accounts are reduced together as one 2-D array with `numpy.add.reduceat`
+    over the integer boundaries of each target period. Each account is aggregated
+    according to the account registry in `projects.accounts`; NaNs are skipped as in
+    pandas. Coarser frequencies are cascaded from the next finer requested frequency
+    rather than from the block-level data. Means are carried as sums alongside the
+    number of values in each period, so a cascaded mean equals the mean over the
+    underlying blocks.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The decoded block-level statement, accounts x epoch seconds of each period start
+    frequencies : list-like of str
+        The target frequencies, any of `CASCADE`
+
+    Returns
+    -------
+    dict of frequency -> pandas.DataFrame, accounts x epoch seconds of each period start
+    """
+    frequencies = [f for f in CASCADE if f in frequencies]
+    aggs = np.array([get_account(name).agg for name in df.index])
+    last = aggs == 'last'
+    mean = aggs[aggs != 'last'] == 'mean' # mean rows among the summed rows
+
+    starts = np.asarray(df.columns, dtype='int64').astype('datetime64[s]')
+    values = df.to_numpy(dtype='float64')
+
+    valid = ~np.isnan(values[~last])
+    sums = np.where(valid, values[~last], 0)
+    counts = valid[mean].astype('int64')
+    lasts = values[last]
+
+    resampled = {}
+    for frequency in frequencies:
+        bounds, positions, starts = period_boundaries(starts, frequency)
+        size = starts.size
+
+        sums = _scatter(np.add.reduceat(sums, bounds, axis=1), positions, size, 0)
+        counts = _scatter(np.add.reduceat(counts, bounds, axis=1), positions, size, 0)
+        lasts = _scatter(_reduce_last(lasts, bounds), positions, size, np.nan)
+
+        out = np.empty((values.shape[0], size))
+        out[~last] = sums
+        out[last] = lasts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[np.flatnonzero(~last)[mean]] = sums[mean] / counts
+
+        resampled[frequency] = pd.DataFrame(out, index=df.index, columns=starts.astype('int64'))
+
+    return resampled
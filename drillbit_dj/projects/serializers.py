@@ -1,18 +1,33 @@
-import json
+import os
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 
+import django
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
-from django.db import transaction
+from django.db import connections, transaction
+from django.utils import timezone
 from rest_framework import serializers
 
 from drillbit.__new_objects import Project as ProjectManager
 from drillbit.statements.statements import init_environment, ProjectTemplate, ROITemplate, \
     analysis
 
-from drillbit_dj.project import ProjectListSerializer, GetOrCreateSerializerMixin
-
+from drillbit_dj.cache import ByteBudgetLRUCache
+from drillbit_dj.project import ProjectListSerializer, GetOrCreateSerializerMixin, SparseFieldsSerializerMixin
+
+from .storage import get_statement_store, load_statement, statement_accounts
+from .periods import labels_to_period_starts, format_labels, to_epochs
+from .resample import resample_statement
+from .dependencies import INPUTS, recompute_statements
+from .fingerprint import simulation_fingerprint, environment_version
+from .charts import account_datasets, chart_frame, sizeof_datasets
+from .locks import single_flight, single_flight_many, held, queued
+from .status import status_matrix
+from .preview import preview_statement
 from .models import RigForProject, InfraForProject, Project, Projects, \
-    ProjectSimulation, ProjectStatement, ProjectStatementSummary
+    ProjectSimulation, ProjectStatement, ProjectStatementSummary, StatementValue, StatementChartSeries
 
 from environment.models import Environment
 from environment.serializers import BlockScheduleSerializer, BitcoinPriceSerializer, \
@@ -22,16 +37,42 @@ from products.serializers import RigSerializer, CoolingSerializer, HeatRejection
 
 class StatementFromJSONConversionField(serializers.JSONField):
     """
-    Color objects are serialized into 'rgb(#, #, #)' notation.
+    Statements are decoded by the configured statement store and 
+    serialized into a list of records plus the column names.
     """
-    def to_representation(self, value):
-        value = json.loads(value)
-        value = pd.DataFrame(value)            
-        stat = {
-            'stat': value.reset_index().to_dict(orient='records'),
-            'columns': value.reset_index().columns.tolist()
-        }
-        return stat
+    def get_attribute(self, instance):
+        # the period labels depend on the frequency of the statement, and saved
+        # statements are loaded through the disk cache
+        return instance
+
+    def to_representation(self, instance):
+        df = load_statement(instance, self.source)
+        if df is None:
+            return None
+
+        return statement_to_representation(df, instance.frequency, self.source)
+
+def statement_to_representation(df, frequency, statement):
+    """
+    Formats the epoch columns of a statement into labels and converts it to records
+    """
+    df = df.copy(deep=False)
+    df.columns = format_labels(df.columns, frequency, statement)
+    df = df.reset_index()
+    return {
+        'stat': df.to_dict(orient='records'),
+        'columns': df.columns.tolist()
+    }
+
+def statement_to_columns(df, frequency, statement):
+    """
+    Formats a statement column-wise for the binary renderers; see `drillbit_dj.renderers`.
+    The period labels are under 'period' and the values of each account under its name.
+    """
+    return {
+        'period': format_labels(df.columns, frequency, statement).tolist(),
+        **dict(zip(df.index, df.to_numpy(dtype='float64'))),
+    }
 
 class RigForProjectSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(allow_null=True, required=False) # needs to be declared explicilty so it is not read-only and available for updates
@@ -100,7 +141,7 @@ class InfraForProjectSerializer(serializers.ModelSerializer):
     def get_cost(self, obj):
         return obj.price * obj.quantity
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(allow_null=True, required=False) # needs to be declared explicilty so it is not read-only and available for updates
     rigs = RigForProjectSerializer(many=True, required=False)
     infrastructure = InfraForProjectSerializer(many=True, required=False)
@@ -173,9 +214,10 @@ class ProjectSerializer(serializers.ModelSerializer):
         rigs_data = validated_data.pop('rigs', [])
         infra_data = validated_data.pop('infrastructure', [])
 
+        # `update` skips auto_now; the timestamp versions the responses that show the project
         project._meta.model.objects \
             .filter(pk=project.pk) \
-            .update(**validated_data)
+            .update(**validated_data, updated_at=timezone.now())
 
         # delete rigs and infra that are not in the list
         RigForProject.objects \
@@ -421,6 +463,7 @@ class ProjectSimulationSerializer(serializers.ModelSerializer):
         return obj
 
 class ProjectStatementSerializer(
+    SparseFieldsSerializerMixin,
     BitcoinUtilityInitMixin,
     serializers.ModelSerializer
 ):
@@ -459,40 +502,173 @@ class ProjectStatementSerializer(
         try:
             obj = ProjectStatement.objects.get(sim=sim, frequency=frequency)
         except ProjectStatement.DoesNotExist:
-            if frequency == '10T':
-                env, istat, roi, summary = create_new_block_level_statement(sim)
-            else:
-                try: 
-                    obj = ProjectStatement.objects.get(sim=sim, frequency='10T')
-                except ProjectStatement.DoesNotExist:
-                    raise serializers.ValidationError((
-                        'You must save the block level '
-                        'statements first.'
-                    ))
-                env = load_json_block_statement_and_resample(obj.env, frequency)
-                istat = load_json_block_statement_and_resample(obj.istat, frequency)
-
-                if frequency in ['M', 'Q', 'Y']: # ROI cannot be less than monthly
-                    roi = load_json_block_statement_and_resample(obj.roi, frequency)
-                else:
-                    roi = None
-
-            with transaction.atomic():
-                obj = ProjectStatement.objects.create(
+            # concurrent requests for the same statement wait for the first to compute it
+            with single_flight('statement', sim.id, frequency):
+                obj = self._create(sim, frequency)
+
+        return obj
+
+    def _create(self, sim, frequency):
+        try:
+            return ProjectStatement.objects.get(sim=sim, frequency=frequency)
+        except ProjectStatement.DoesNotExist:
+            pass
+
+        if frequency == '10T':
+            fingerprint = simulation_fingerprint(sim)
+            copied = copy_statements_by_fingerprint(sim, fingerprint)
+            if copied is not None:
+                return copied
+            env, istat, roi, summary = create_new_block_level_statement(sim)
+        else:
+            try: 
+                block = ProjectStatement.objects.get(sim=sim, frequency='10T')
+            except ProjectStatement.DoesNotExist:
+                raise serializers.ValidationError((
+                    'You must save the block level '
+                    'statements first.'
+                ))
+            if frequency not in settings.PERSISTED_FREQUENCIES:
+                # served from the cache only; the instance is never saved
+                return resampled_statement(block, frequency)
+            env, istat, roi = get_resampled_statement(block, frequency)
+
+        with transaction.atomic():
+            obj, = upsert_statements([
+                ProjectStatement(
                     sim=sim,
                     frequency=frequency,
                     env=env,
                     istat=istat,
                     roi=roi,
+                    inputs=project_inputs(sim.project) if frequency == '10T' else {},
+                    fingerprint=fingerprint if frequency == '10T' else '',
                 )
-                if frequency == '10T':
-                    summ = ProjectStatementSummary.objects.create(
-                        sim=sim,
-                        summary=summary,
-                    )
+            ])
+            if frequency == '10T':
+                upsert_summaries([ProjectStatementSummary(sim=sim, summary=summary)])
+            if settings.NORMALIZED_STATEMENTS:
+                write_normalized_statement(obj)
 
         return obj
+
+STATEMENT_FIELDS = ['env', 'istat', 'roi', 'inputs', 'fingerprint', 'updated_at']
+
+def upsert_statements(objs):
+    """
+    Inserts `objs`, overwriting any statement already saved for the same simulation 
+    and frequency, so a computation that lost a race cannot fail or duplicate rows.
+
+    Returns
+    -------
+    `objs`, with the primary keys of their rows
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+
+    ProjectStatement.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=['sim', 'frequency'],
+        update_fields=STATEMENT_FIELDS,
+    )
+    # not every backend returns the primary keys of upserted rows
+    pks = {
+        (sim_id, frequency): pk
+        for sim_id, frequency, pk in ProjectStatement.objects
+            .filter(sim__in={obj.sim_id for obj in objs}, frequency__in={obj.frequency for obj in objs})
+            .values_list('sim_id', 'frequency', 'pk')
+    }
+    for obj in objs:
+        obj.pk = pks[(obj.sim_id, obj.frequency)]
+        obj._state.adding = False
+        if obj.frequency in settings.CHART_FREQUENCIES:
+            write_chart_series(obj)
+
+    return objs
+
+def upsert_summaries(objs):
+    """
+    Inserts `objs`, overwriting the summary already saved for the same simulation
+    """
+    return ProjectStatementSummary.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=['sim'],
+        update_fields=['summary', 'stale', 'updated_at'],
+    )
     
+def copy_statements_by_fingerprint(sim, fingerprint):
+    """
+    Copies the saved statements and summary of another simulation with the same inputs 
+    to `sim`, instead of computing them again; see `projects.fingerprint`.
+
+    Returns
+    -------
+    The block-level `ProjectStatement` of `sim`, or None if no simulation matches
+    """
+    source = ProjectStatement.objects \
+        .filter(frequency='10T', fingerprint=fingerprint) \
+        .exclude(sim=sim) \
+        .order_by('-updated_at') \
+        .first()
+    if source is None:
+        return None
+    summary = ProjectStatementSummary.objects.filter(sim=source.sim_id).first()
+    if summary is None:
+        return None
+
+    with transaction.atomic():
+        objs = upsert_statements([
+            ProjectStatement(
+                sim=sim,
+                frequency=stat.frequency,
+                env=stat.env,
+                istat=stat.istat,
+                roi=stat.roi,
+                inputs=stat.inputs,
+                fingerprint=stat.fingerprint,
+            )
+            for stat in ProjectStatement.objects.filter(sim=source.sim_id)
+        ])
+        upsert_summaries([ProjectStatementSummary(sim=sim, summary=summary.summary, stale=summary.stale)])
+        if settings.NORMALIZED_STATEMENTS:
+            for obj in objs:
+                write_normalized_statement(obj)
+
+    return next(obj for obj in objs if obj.frequency == '10T')
+
+def write_normalized_statement(stat):
+    """
+    Writes the long-format copy of a saved statement to `StatementValue`, replacing
+    any written before
+    """
+    stat.values.all().delete()
+    for name in ('env', 'istat', 'roi'):
+        df = load_statement(stat, name)
+        if df is None:
+            continue
+        StatementValue.objects.bulk_write(
+            stat,
+            name,
+            df,
+            batch_size=settings.NORMALIZED_STATEMENT_BATCH_SIZE,
+        )
+
+def write_chart_series(stat):
+    """
+    Materializes the chart series of every account of a saved statement, replacing 
+    any written before; see `StatementChartSeries`
+    """
+    store = get_statement_store()
+    df = chart_frame(load_statement(stat, name) for name in ('env', 'istat', 'roi'))
+    stat.chart_series.all().delete()
+    StatementChartSeries.objects.bulk_create([
+        StatementChartSeries(statement=stat, account=account, data=store.encode(df.loc[[account]]))
+        for account in df.index
+    ])
+
 def scale_project_object(project):
     proj = project.as_drillbit_object()
     proj.scale()
@@ -505,18 +681,43 @@ def scale_project_object(project):
         infra.quantity = scaled.quantity
         infra.save()
 
-def create_new_block_level_statement(sim):
+def _sizeof_environment(value):
+    # the `drillbit` environment holds arrays over the same blocks as the schedules; it is
+    # counted as `ENVIRONMENT_SIZE_FACTOR` times the decoded schedules
+    blocks, env, nbytes = value
+    return nbytes * settings.ENVIRONMENT_SIZE_FACTOR
+
+environment_cache = ByteBudgetLRUCache(
+    settings.ENVIRONMENT_CACHE_MAX_BYTES,
+    sizeof=_sizeof_environment,
+)
+
+def build_environment(environment):
+    """
+    Returns the decoded block schedule and the `drillbit` environment of an `Environment`,
+    from the in-process cache where possible. The key includes `environment_version`, 
+    so editing the environment or any of its schedules never serves a stale result.
+
+    Returns
+    -------
+    tuple of the block schedule and the `drillbit` environment
+    """
+    key = (environment.id, environment_version(environment))
+    blocks, env, _ = environment_cache.get_or_set(key, lambda: _build_environment(environment))
+    return blocks, env
+
+def _build_environment(environment):
     blocks = BlockScheduleSerializer(
-        sim.environment.block_schedule, 
+        environment.block_schedule, 
     ).to_schedule(with_period_index=True)
     price = BitcoinPriceSerializer(
-        sim.environment.bitcoin_price, 
+        environment.bitcoin_price, 
     ).to_schedule()
     fees = TransactionFeesSerializer(
-        sim.environment.transaction_fees,
+        environment.transaction_fees,
     ).to_schedule()
     hash_rate = HashRateSerializer(
-        sim.environment.hash_rate, 
+        environment.hash_rate, 
     ).to_schedule()
 
     env = init_environment(
@@ -526,19 +727,30 @@ def create_new_block_level_statement(sim):
         hash_rate.forecast * 1e6 * 1e12 # convert from M TH/s to H/s
         #// hack to handle network hash rate b/c number is too big for calculation; see FactorForm line 55 for offsetting hack in frontend
     )
-    if sim.project.target_ambient_temp:
-        temp = fit_temperature_to_environment(sim.project.target_ambient_temp, blocks)
-        project = sim.project.as_drillbit_object(temp)
+    nbytes = sum(int(df.memory_usage(deep=True).sum()) for df in (blocks, price, fees, hash_rate))
+    return blocks, env, nbytes
+
+def simulate_project(project, env, blocks):
+    """
+    Evaluates a project against a built environment
+
+    Returns
+    -------
+    tuple of the encoded (env, istat, roi) block-level statements and the summary; roi may be None
+    """
+    if project.target_ambient_temp:
+        temp = fit_temperature_to_environment(project.target_ambient_temp, blocks)
+        project = project.as_drillbit_object(temp)
     else:
-        project = sim.project.as_drillbit_object()
+        project = project.as_drillbit_object()
 
     project.implement()
 
     stat = ProjectTemplate(env, project, add_roi=True)
 
-    env = stat.env.to_frame(with_periods=False).to_json()
-    istat = stat.istat.to_frame(with_periods=False).to_json()
-    roi = stat.roi.to_frame(with_periods=False).to_json() if hasattr(stat, 'roi') else None
+    env = encode_block_level_frame(stat.env.to_frame(with_periods=False), 'env')
+    istat = encode_block_level_frame(stat.istat.to_frame(with_periods=False), 'istat')
+    roi = encode_block_level_frame(stat.roi.to_frame(with_periods=False), 'roi') if hasattr(stat, 'roi') else None
     summary = analysis(stat, project).summary()
 
     import math
@@ -549,43 +761,451 @@ def create_new_block_level_statement(sim):
 
     return env, istat, roi, summary
 
-def load_json_block_statement_and_resample(value, frequency):
-    value = json.loads(value)
-    df = pd.DataFrame(value)
+def create_new_block_level_statement(sim):
+    blocks, env = build_environment(sim.environment)
+    return simulate_project(sim.project, env, blocks)
+
+def _init_simulation_worker():
+    # spawned workers need Django set up; forked workers must not share the parent's connections
+    django.setup()
+    connections.close_all()
+
+def _simulate(sim):
+    blocks, env = build_environment(sim.environment) # cached for the life of the process
+    return simulate_project(sim.project, env, blocks)
+
+def _simulate_by_id(sim_id):
+    sim = ProjectSimulation.objects.select_related(
+        'project',
+        'environment__block_schedule',
+        'environment__bitcoin_price',
+        'environment__transaction_fees',
+        'environment__hash_rate',
+    ).get(pk=sim_id)
+    return _simulate(sim)
+
+def simulate_many(sims, processes=None):
+    """
+    Simulates each of `sims`, across a local pool of `processes` worker processes 
+    when there is more than one. Each worker builds an environment once.
 
-    # have to catch different formats between ROI and others
-    if len(df.columns[0]) == 7:
-        fmt = '%Y-%m'
-    else:
-        fmt = '%d-%m-%y %H:%M'
-
-    df.columns = pd.to_datetime(df.columns, format=fmt)
-    # HERE I NEED DIFFERENT RESAMPLE FUNCTIONS FOR DIFFERENT
-    # ROWS .....!!!!!
-    last = [
-        'Number of Rigs', 
-        'BTC Value, if held',
-        'BTC, if held',  
-    ]
-    mean = [
-        'Hash Rate', # technically INCORRECT; should add up all hashes in period, divide by seconds in period
-        'Hash Share',
-    ]
-    aggs = {}
-    for index in df.index:
-        if index in last:
-            aggs[index] = 'last'
-        elif index in mean:
-            aggs[index] = 'mean'
+    Returns
+    -------
+    list of the results of `simulate_project`, in the order of `sims`
+    """
+    processes = min(processes or os.cpu_count() or 1, len(sims))
+    if processes <= 1:
+        return [_simulate(sim) for sim in sims]
+
+    connections.close_all() # reopened on next use
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_simulation_worker) as pool:
+        return list(pool.map(_simulate_by_id, [sim.id for sim in sims]))
+
+def create_block_level_statements(sims, processes=1):
+    """
+    Creates the block-level statements and summaries of many simulations.
+
+    Simulations that already have a block-level statement are skipped, and those 
+    whose inputs match another simulation copy its results; see 
+    `copy_statements_by_fingerprint`. Simulations with the same inputs within the
+    batch are only simulated once. The rest are simulated by `simulate_many`, in order
+    of environment, and the results are written in one transaction with one 
+    `bulk_create` per model.
+
+    Parameters
+    ----------
+    sims : iterable of ProjectSimulation
+    processes : int, optional
+        The number of local worker processes to simulate with; None for one per core.
+        Default: 1
+
+    Returns
+    -------
+    list of the block-level `ProjectStatement` of each simulation
+    """
+    sims = list(sims)
+    blocks = ProjectStatement.objects.filter(sim__in=sims, frequency='10T')
+    existing = {stat.sim_id: stat for stat in blocks}
+
+    # other callers creating any of the same statements wait for this batch; the 
+    # statements they created while this one waited are not computed again
+    keys = [('statement', sim.id, '10T') for sim in sims if sim.id not in existing]
+    with single_flight_many(keys):
+        existing = {stat.sim_id: stat for stat in blocks.all()}
+
+        pending, unique = [], {}
+        for sim in sorted(sims, key=lambda sim: sim.environment_id):
+            if sim.id in existing:
+                continue
+            fingerprint = simulation_fingerprint(sim)
+            copied = copy_statements_by_fingerprint(sim, fingerprint)
+            if copied is not None:
+                existing[sim.id] = copied
+                continue
+            pending.append((sim, fingerprint))
+            unique.setdefault(fingerprint, sim)
+
+        computed = dict(zip(unique, simulate_many(list(unique.values()), processes)))
+        results = [(sim, fingerprint, computed[fingerprint]) for sim, fingerprint in pending]
+
+        with transaction.atomic():
+            objs = upsert_statements([
+                ProjectStatement(
+                    sim=sim,
+                    frequency='10T',
+                    env=env,
+                    istat=istat,
+                    roi=roi,
+                    inputs=project_inputs(sim.project),
+                    fingerprint=fingerprint,
+                )
+                for sim, fingerprint, (env, istat, roi, _) in results
+            ])
+            upsert_summaries([
+                ProjectStatementSummary(sim=sim, summary=summary)
+                for sim, _, (*_, summary) in results
+            ])
+            if settings.NORMALIZED_STATEMENTS:
+                for obj in objs:
+                    write_normalized_statement(obj)
+
+    existing.update((obj.sim_id, obj) for obj in objs)
+    return [existing[sim.id] for sim in sims]
+
+def project_inputs(project):
+    return {field: getattr(project, field) for field in INPUTS}
+
+def update_block_level_statement(sim):
+    """
+    Brings the block-level statement of `sim` up to date with the inputs of its project
+    by recomputing only the accounts that depend on the changed inputs; see 
+    `projects.dependencies`. Statements at other frequencies are deleted, to be 
+    resampled again from the updated block-level statement. The summary is computed
+    by `drillbit` from a full simulation, so it is only marked stale, until the 
+    statements are next rebuilt.
+
+    Returns
+    -------
+    bool, False if the statement could not be updated and must be rebuilt from scratch,
+    i.e. if anything but `INPUTS` changed since it was built
+    """
+    block = ProjectStatement.objects.get(sim=sim, frequency='10T')
+    fingerprint = simulation_fingerprint(sim)
+    if block.fingerprint == fingerprint:
+        return True
+    if not block.inputs or not block.fingerprint: # built before inputs were recorded
+        return False
+    if simulation_fingerprint(sim, overrides=block.inputs) != block.fingerprint:
+        return False
+    inputs = project_inputs(sim.project)
+
+    names = ('env', 'istat', 'roi')
+    frames = recompute_statements({name: load_statement(block, name) for name in names}, block.inputs, inputs)
+    if frames is None:
+        return False
+
+    store = get_statement_store()
+    with transaction.atomic():
+        for name in names:
+            if frames[name] is not None:
+                setattr(block, name, store.encode(frames[name]))
+        block.inputs = inputs
+        block.fingerprint = fingerprint
+        block.save()
+
+        ProjectStatement.objects.filter(sim=sim).exclude(pk=block.pk).delete()
+        ProjectStatementSummary.objects.filter(sim=sim).update(stale=True, updated_at=timezone.now())
+        if block.frequency in settings.CHART_FREQUENCIES:
+            write_chart_series(block)
+        if settings.NORMALIZED_STATEMENTS:
+            block.values.all().delete()
+            write_normalized_statement(block)
+
+    return True
+
+def encode_block_level_frame(df, statement):
+    """
+    Parses the period labels of a `drillbit` statement into epoch seconds, once, 
+    and encodes it with the statement store
+    """
+    df.columns = to_epochs(labels_to_period_starts(df.columns, '10T', statement))
+    return get_statement_store().encode(df)
+
+ROI_FREQUENCIES = ['M', 'Q', 'Y'] # ROI cannot be less than monthly
+
+def resample_block_statement(block, frequencies):
+    """
+    Decodes each part of the block-level statement once and resamples it
+    to every requested frequency in a single pass.
+
+    Returns
+    -------
+    dict of frequency -> tuple of the encoded (env, istat, roi) statements; roi may be None
+    """
+    store = get_statement_store()
+    resampled = {}
+    for name in ('env', 'istat', 'roi'):
+        if name == 'roi':
+            targets = [f for f in frequencies if f in ROI_FREQUENCIES]
         else:
-            aggs[index] = 'sum'
+            targets = frequencies
 
-    df = df.T.resample(frequency).agg(aggs).T
+        df = load_statement(block, name) if targets else None
+        if df is None:
+            resampled[name] = {}
+        else:
+            frames = resample_statement(df, targets)
+            resampled[name] = {f: store.encode(df) for f, df in frames.items()}
 
-    strfmt = '%Y-%m-%d %HH' if frequency == 'H' else '%Y-%m-%d'
-    df.columns = df.columns.strftime(strfmt)
-    
-    return df.to_json()
+    return {
+        f: tuple(resampled[name].get(f) for name in ('env', 'istat', 'roi'))
+        for f in frequencies
+    }
+
+def create_resampled_statements(sim, frequencies):
+    """
+    Creates the statements of `sim` at each of `frequencies` that do not exist yet,
+    from a single pass over the block-level statement.
+    """
+    block = ProjectStatement.objects.get(sim=sim, frequency='10T')
+    with single_flight_many(('statement', sim.id, f) for f in frequencies):
+        existing = ProjectStatement.objects \
+            .filter(sim=sim, frequency__in=frequencies) \
+            .values_list('frequency', flat=True)
+        frequencies = [f for f in frequencies if f not in existing]
+        if not frequencies:
+            return []
+
+        resampled = resample_block_statement(block, frequencies)
+        with transaction.atomic():
+            objs = upsert_statements([
+                ProjectStatement(sim=sim, frequency=f, env=env, istat=istat, roi=roi)
+                for f, (env, istat, roi) in resampled.items()
+            ])
+            if settings.NORMALIZED_STATEMENTS:
+                for obj in objs:
+                    write_normalized_statement(obj)
+
+    return objs
+
+def _sizeof_statement(blobs):
+    return sum(len(blob) for blob in blobs if blob is not None)
+
+statement_cache = ByteBudgetLRUCache(
+    settings.STATEMENT_CACHE_MAX_BYTES,
+    ttl=settings.STATEMENT_CACHE_TTL,
+    sizeof=_sizeof_statement,
+)
+
+def get_resampled_statement(block, frequency):
+    """
+    Resamples the block-level statement on first request and caches the encoded result.
+
+    The key includes the block-level `updated_at`, so a recomputed block-level 
+    statement never serves a stale resample.
+
+    Returns
+    -------
+    tuple of the encoded (env, istat, roi) statements; roi may be None
+    """
+    key = (block.sim_id, frequency, block.updated_at)
+    return statement_cache.get_or_set(key, lambda: resample_block_statement(block, [frequency])[frequency])
+
+def resampled_statement(block, frequency):
+    """
+    An unsaved statement of the simulation of `block` at `frequency`, resampled from
+    it through `statement_cache`. It is dated as `block`, so caches keyed on the
+    `updated_at` of a statement follow the block-level statement.
+    """
+    env, istat, roi = get_resampled_statement(block, frequency)
+    return ProjectStatement(
+        sim=block.sim,
+        frequency=frequency,
+        env=env,
+        istat=istat,
+        roi=roi,
+        updated_at=block.updated_at,
+    )
+
+def get_statement(sim, frequency):
+    """
+    The statement of `sim` at `frequency`: the saved one, or for the frequencies
+    not in `settings.PERSISTED_FREQUENCIES` one resampled from the block-level statement.
+    The statements of saved rows are deferred; see `load_statement`.
+
+    Raises
+    ------
+    ProjectStatement.DoesNotExist
+        If the statement, or the block-level statement it is resampled from, is not saved
+    """
+    persisted = frequency == '10T' or frequency in settings.PERSISTED_FREQUENCIES
+    stat = ProjectStatement.objects \
+        .defer('env', 'istat', 'roi') \
+        .get(sim=sim, frequency=frequency if persisted else '10T')
+    return stat if persisted else resampled_statement(stat, frequency)
+
+chart_cache = ByteBudgetLRUCache(
+    settings.CHART_CACHE_MAX_BYTES,
+    ttl=settings.STATEMENT_CACHE_TTL,
+    sizeof=sizeof_datasets,
+)
+
+def projects_by_account(environment, projects, frequency, accounts=None):
+    """
+    Compares the accounts of the statements of `projects` in `environment`, as 
+    Chart.js datasets; see `account_datasets`.
+
+    Nothing is computed or saved: the saved statements are read, and those not
+    saved at `frequency` are resampled from the block-level statement through
+    `statement_cache`. Projects without a statement are listed under 'missing'.
+    Payloads are cached by the statements they were built from.
+    """
+    stats = ProjectStatement.objects \
+        .filter(sim__environment=environment, sim__project__in=projects, frequency__in={frequency, '10T'}) \
+        .select_related('sim__project') \
+        .defer('env', 'istat', 'roi')
+
+    by_sim = {}
+    for stat in stats:
+        if stat.frequency == frequency or stat.sim_id not in by_sim:
+            by_sim[stat.sim_id] = stat
+    stats = list(by_sim.values())
+
+    key = (
+        environment,
+        tuple(sorted(str(project) for project in projects)),
+        frequency,
+        tuple(accounts or ()),
+        tuple(sorted((stat.pk, stat.updated_at) for stat in stats)),
+        # projects are labelled by name
+        tuple(sorted((stat.sim.project_id, stat.sim.project.name, stat.sim.project.updated_at) for stat in stats)),
+    )
+    return chart_cache.get_or_set(key, lambda: _projects_by_account(stats, projects, frequency, accounts))
+
+def _projects_by_account(stats, projects, frequency, accounts):
+    # the materialized chart series of the saved statements, in one query
+    charted = {}
+    if frequency in settings.CHART_FREQUENCIES:
+        store = get_statement_store()
+        series = StatementChartSeries.objects.filter(statement__in=[stat.pk for stat in stats if stat.frequency == frequency])
+        if accounts:
+            series = series.filter(account__in=accounts)
+        for statement_id, data in series.values_list('statement_id', 'data'):
+            charted.setdefault(statement_id, []).append(store.decode(data))
+
+    # by project, as projects may share a name
+    frames, names = {}, {}
+    for stat in stats:
+        project = stat.sim.project_id
+        names[project] = stat.sim.project.name
+        if stat.frequency == frequency and stat.pk in charted:
+            frames[project] = pd.concat(charted[stat.pk])
+            continue
+
+        # written before chart series were materialized, or at a frequency that is not charted
+        if stat.frequency != frequency: # not persisted; resampled from the block-level statement
+            stat = resampled_statement(stat, frequency)
+
+        if settings.NORMALIZED_STATEMENTS and stat.pk is not None: # cached resamples are not normalized
+            dfs = [
+                StatementValue.objects.to_frame(stat.sim, frequency, statement, accounts=accounts)
+                for statement in ('env', 'istat', 'roi')
+            ]
+        else:
+            dfs = [load_statement(stat, statement, accounts=accounts) for statement in ('env', 'istat', 'roi')]
+        frames[project] = chart_frame(dfs)
+
+    found = {str(stat.sim.project_id) for stat in stats}
+    return {
+        **account_datasets(frames, names),
+        'missing': [project for project in projects if str(project) not in found],
+    }
+
+def _sizeof_preview(value):
+    epochs, values = value
+    return epochs.nbytes + values.nbytes
+
+preview_cache = ByteBudgetLRUCache(
+    settings.PREVIEW_CACHE_MAX_BYTES,
+    ttl=settings.STATEMENT_CACHE_TTL,
+    sizeof=_sizeof_preview,
+)
+
+def statement_preview(stat, statement, n, accounts=None, start=None, end=None):
+    """
+    Downsamples the accounts of one statement of `stat` to `n` periods each; see `projects.preview`.
+
+    Each account is cached by simulation, account and `n`, and the version of the 
+    statement, so only the accounts not cached are read and downsampled. Without
+    `accounts`, those of the statement are listed from its header first.
+
+    Returns
+    -------
+    list of `{account, periods, values}`, with the labels of the periods kept; NaNs are None
+    """
+    def key(account):
+        return (stat.sim_id, stat.frequency, statement, account, n, start, end, stat.updated_at)
+
+    accounts = accounts or statement_accounts(stat, statement)
+    if not accounts:
+        return []
+
+    previews = {account: preview_cache.get(key(account)) for account in accounts}
+    previews = {account: value for account, value in previews.items() if value is not None}
+
+    missing = [account for account in accounts if account not in previews]
+    if missing:
+        df = load_statement(stat, statement, accounts=missing, start=start, end=end)
+        if df is not None and not df.empty:
+            for account, value in preview_statement(df, n).items():
+                preview_cache.set(key(account), value)
+                previews[account] = value
+
+    return [
+        {
+            'account': account,
+            'periods': format_labels(previews[account][0], stat.frequency, statement).tolist(),
+            'values': [None if np.isnan(value) else value for value in previews[account][1].tolist()],
+        }
+        for account in accounts if account in previews
+    ]
+
+STATUS_FREQUENCIES = ['10T', 'H', 'D', 'M', 'Q', 'A']
+
+def statement_status(environments, projects, frequencies=None):
+    """
+    The state of the statements of every pair of `environments` and `projects`, 
+    from one query over the simulations and their statements and one check each of
+    the statements being computed and queued; see `projects.status`
+    """
+    frequencies = frequencies or STATUS_FREQUENCIES
+    rows = ProjectSimulation.objects \
+        .filter(environment__in=environments, project__in=projects) \
+        .values_list(
+            'id', 'environment_id', 'project_id', 'project__updated_at',
+            *(f'project__{field}' for field in INPUTS),
+            'projectstatement__frequency', 'projectstatement__inputs', 'projectstatement__updated_at',
+        )
+
+    sims = {}
+    for sim_id, environment, project, updated_at, *values in rows:
+        *inputs, frequency, built_inputs, built_at = values
+        sim = sims.setdefault((str(environment), str(project)), {
+            'id': sim_id,
+            'inputs': dict(zip(INPUTS, inputs)),
+            'updated_at': updated_at,
+            'statements': {},
+        })
+        if frequency is not None:
+            sim['statements'][frequency] = (built_inputs, built_at)
+
+    keys = [
+        ('statement', sim['id'], frequency) 
+        for sim in sims.values() for frequency in {'10T', *frequencies}
+    ]
+    running = held(keys) | queued(keys)
+    running = {(sim_id, frequency) for _, sim_id, frequency in running}
+    return status_matrix(environments, projects, frequencies, sims, settings.PERSISTED_FREQUENCIES, running)
 
 def fit_temperature_to_environment(temp, blocks):
     # temp = pd.Series(temp['data'], index=pd.PeriodIndex(temp['periods'], freq='H'))
@@ -629,7 +1249,9 @@ class ProjectStatementSummarySerializer(serializers.ModelSerializer):
             'environment',
             'project',
             'summary',
+            'stale',
         )
+        read_only_fields = ('stale',)
         list_serializer_class = ProjectListSerializer
 
     def create(self, *args, **kwargs):
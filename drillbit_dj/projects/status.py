@@ -0,0 +1,83 @@
+"""
+States of the statements of many simulations, for the status matrix of a dashboard.
+"""
+READY = 'ready'
+STALE = 'stale'
+IN_PROGRESS = 'in_progress'
+MISSING = 'missing'
+NO_SIMULATION = 'no_simulation'
+
+def statement_state(statements, frequency, persisted, inputs, updated_at, running):
+    """
+    The state of the statement of one simulation at `frequency`
+
+    Parameters
+    ----------
+    statements : dict of str -> (dict, datetime)
+        The inputs and `updated_at` of each saved statement of the simulation, by frequency
+    frequency : str
+    persisted : list of str
+        The frequencies that are saved; the others are resampled on request from
+        the block-level statement
+    inputs : dict
+        The current values of `projects.dependencies.INPUTS` of the project
+    updated_at : datetime
+        When the project was last changed
+    running : set of str
+        The frequencies of the simulation being computed, or queued for a worker
+
+    Returns
+    -------
+    str, one of `READY`, `STALE`, `IN_PROGRESS` or `MISSING`
+    """
+    source = frequency if frequency in persisted else '10T'
+    if source in running or '10T' in running:
+        return IN_PROGRESS
+    if source not in statements or '10T' not in statements:
+        return MISSING
+
+    built_inputs, built_at = statements['10T']
+    if (built_inputs and built_inputs != inputs) or updated_at > built_at:
+        return STALE
+    return READY
+
+def status_matrix(environments, projects, frequencies, sims, persisted, running):
+    """
+    Builds the status of every pair of `environments` and `projects` at each of `frequencies`
+
+    Parameters
+    ----------
+    environments, projects : list
+        The requested ids, in the order of the result
+    frequencies : list of str
+    sims : dict of (str, str) -> dict
+        By (environment id, project id), the `id`, project `inputs` and `updated_at`,
+        and `statements` of each simulation, as in `statement_state`
+    persisted : list of str
+    running : set of (int, str)
+        The (simulation id, frequency) of the statements being computed, or queued for a worker
+
+    Returns
+    -------
+    list of dict, `{environment, project, sim, statements: {frequency: state}}`
+    """
+    matrix = []
+    for environment in environments:
+        for project in projects:
+            sim = sims.get((str(environment), str(project)))
+            if sim is None:
+                states = dict.fromkeys(frequencies, NO_SIMULATION)
+            else:
+                sim_running = {f for sim_id, f in running if sim_id == sim['id']}
+                states = {
+                    f: statement_state(sim['statements'], f, persisted, sim['inputs'], sim['updated_at'], sim_running)
+                    for f in frequencies
+                }
+            matrix.append({
+                'environment': environment,
+                'project': project,
+                'sim': None if sim is None else sim['id'],
+                'statements': states,
+            })
+
+    return matrix
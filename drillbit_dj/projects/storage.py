@@ -0,0 +1,395 @@
+import io
+import json
+import struct
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+from django.db.models.functions import Length, Substr
+from django.utils.module_loading import import_string
+
+from .accounts import get_account
+from .codecs import compress, decompress
+from .diskcache import get_disk_cache, statement_version
+from .periods import to_epoch
+
+DEFAULT_STATEMENT_STORE = 'projects.storage.ColumnarStatementStore'
+
+def slice_statement(df, accounts=None, start=None, end=None):
+    """
+    Restricts a decoded statement to the given accounts and inclusive window of period starts
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        A decoded statement, accounts x epoch seconds
+    accounts : list of str, optional
+        Account names to keep, in the order given; unknown names are ignored
+    start, end : int, str or datetime, optional
+        Bounds of the window; strings and datetimes are converted to epoch seconds
+    """
+    if accounts:
+        df = df.loc[pd.Index(accounts).intersection(df.index, sort=False)]
+    if start is not None or end is not None:
+        periods = df.columns.to_numpy()
+        mask = np.ones(periods.size, dtype=bool)
+        if start is not None:
+            mask &= periods >= to_epoch(start)
+        if end is not None:
+            mask &= periods <= to_epoch(end)
+        df = df.loc[:, mask]
+
+    return df
+
+class BytesReader:
+    """
+    Reads byte ranges of a statement that is already in memory
+    """
+    def __init__(self, blob):
+        self.blob = blob
+
+    def size(self):
+        return None if self.blob is None else len(self.blob)
+
+    def read(self, ranges):
+        """
+        Returns the bytes of each (offset, length) range
+        """
+        blob = memoryview(self.blob)
+        return [blob[offset:offset + length] for offset, length in ranges]
+
+    def read_all(self):
+        return self.blob
+
+class FieldReader:
+    """
+    Reads byte ranges of a statement straight from its database column with SUBSTR,
+    so the rest of the statement never leaves the database.
+
+    All ranges passed to one `read` call are fetched with a single query.
+    """
+    def __init__(self, instance, field):
+        self.queryset = type(instance).objects.filter(pk=instance.pk)
+        self.field = field
+
+    def size(self):
+        return self.queryset.annotate(_size=Length(self.field)).values_list('_size', flat=True).get()
+
+    def read(self, ranges):
+        if not ranges:
+            return []
+
+        annotations = {
+            f'_range_{i}': Substr(self.field, offset + 1, length) # SUBSTR is 1-indexed
+            for i, (offset, length) in enumerate(ranges)
+        }
+        values = self.queryset.annotate(**annotations).values_list(*annotations).get()
+        return [bytes(value) for value in values]
+
+    def read_all(self):
+        return self.queryset.values_list(self.field, flat=True).get()
+
+class StatementStore:
+    """
+    Base class for statement storage backends.
+
+    A statement is a DataFrame with accounts on the index and the int64 epoch
+    seconds at which each period starts on the columns. A store converts that
+    frame to and from the bytes held in the `ProjectStatement` binary fields.
+    """
+    def encode(self, df):
+        raise NotImplementedError('`encode` must be implemented by the store')
+
+    def decode(self, blob, accounts=None, start=None, end=None):
+        """
+        Decodes a statement, optionally only the given accounts and inclusive window of periods
+        """
+        raise NotImplementedError('`decode` must be implemented by the store')
+
+    def read(self, reader, accounts=None, start=None, end=None):
+        """
+        Like `decode`, but through a reader. Stores that can locate accounts and
+        periods in their bytes override this to read only the ranges needed.
+        """
+        blob = reader.read_all()
+        if blob is None:
+            return None
+        return self.decode(blob, accounts=accounts, start=start, end=end)
+
+    def accounts(self, reader):
+        """
+        The account names of a statement, in order; None if it is empty. Stores that
+        list them apart from the values override this to read only that part.
+        """
+        df = self.read(reader)
+        return None if df is None else df.index.tolist()
+
+class NpzStatementStore(StatementStore):
+    """
+    Stores a statement as an uncompressed `.npz` archive of typed arrays.
+
+    Values are kept as a single float64 matrix, periods as int64 epoch seconds
+    and account names as a fixed-width unicode array, so the archive never
+    needs pickle to load.
+    """
+    def encode(self, df):
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            values=df.to_numpy(dtype='float64'),
+            index=np.asarray(df.index, dtype=str),
+            periods=np.asarray(df.columns, dtype='int64'),
+        )
+        return buffer.getvalue()
+
+    def decode(self, blob, accounts=None, start=None, end=None):
+        with np.load(io.BytesIO(bytes(blob))) as npz:
+            df = pd.DataFrame(
+                npz['values'],
+                index=npz['index'].tolist(),
+                columns=pd.Index(npz['periods']),
+            )
+        return slice_statement(df, accounts=accounts, start=start, end=end)
+
+class ColumnarStatementStore(StatementStore):
+    """
+    Stores a statement in a seekable layout, so single accounts and windows of periods
+    are read without touching the rest of the statement:
+
+        MAGIC | uint32 header length | JSON header | int64 periods | row | row | ...
+
+    The header lists the accounts and the offset, dtype and codec of each account row.
+    Offsets are relative to the end of the header. Evenly spaced periods are also
+    described by their first value and step, so a window is located without reading
+    the periods.
+
+    Compressed rows are split into blocks of `BLOCK_PERIODS` values that are compressed
+    separately, and the header lists the compressed length of each block, so a window
+    only reads and decompresses the blocks it overlaps. The dtype and codec of each
+    account come from the account registry in `projects.accounts`.
+
+    Readers of this layout must accept headers written by earlier versions of it.
+    """
+    MAGIC = b'DBSTAT01'
+    PREFIX = struct.Struct('<8sI')
+    # bytes read up front, so the header usually arrives in the first round trip
+    HEADER_READ = 16 * 1024
+    BLOCK_PERIODS = 4096
+
+    def __init__(self, codec=None):
+        self.codec = codec or getattr(settings, 'STATEMENT_CODEC', 'raw')
+
+    def encode(self, df):
+        periods = np.asarray(df.columns, dtype='int64')
+
+        header = {
+            'accounts': [str(account) for account in df.index],
+            'n_periods': int(periods.size),
+            'start': int(periods[0]) if periods.size else None,
+            'step': self._step(periods),
+            'rows': [],
+        }
+        chunks = [periods.tobytes()]
+        offset = periods.nbytes
+        for name, values in zip(df.index, df.to_numpy(dtype='float64')):
+            account = get_account(name)
+            dtype = np.dtype(account.dtype).newbyteorder('<')
+            codec = account.codec or self.codec
+            row = {'offset': offset, 'dtype': dtype.str}
+
+            data = np.ascontiguousarray(values, dtype=dtype)
+            if codec == 'raw':
+                blocks = [data.tobytes()]
+            else:
+                blocks = [
+                    compress(data[i:i + self.BLOCK_PERIODS].tobytes(), codec)
+                    for i in range(0, data.size, self.BLOCK_PERIODS)
+                ]
+                row.update(codec=codec, block=self.BLOCK_PERIODS, blocks=[len(block) for block in blocks])
+
+            header['rows'].append(row)
+            chunks.extend(blocks)
+            offset += sum(len(block) for block in blocks)
+
+        header = json.dumps(header).encode()
+        return b''.join([self.PREFIX.pack(self.MAGIC, len(header)), header, *chunks])
+
+    def decode(self, blob, accounts=None, start=None, end=None):
+        return self.read(BytesReader(blob), accounts=accounts, start=start, end=end)
+
+    def read(self, reader, accounts=None, start=None, end=None):
+        header, data_start = self._read_header(reader)
+        if header is None:
+            return None
+
+        names = header['accounts']
+        if accounts:
+            rows = [names.index(account) for account in accounts if account in names]
+        else:
+            rows = list(range(len(names)))
+
+        first, last, periods = self._locate(reader, header, data_start, start, end)
+        n = last - first
+
+        ranges, skips = [], []
+        for i in rows:
+            row = header['rows'][i]
+            itemsize = np.dtype(row['dtype']).itemsize
+            if row.get('codec', 'raw') == 'raw':
+                ranges.append((data_start + row['offset'] + first * itemsize, n * itemsize))
+                skips.append(0)
+            else:
+                # the blocks overlapping the window, and the values to skip in the first one
+                block = row['block']
+                bounds = np.concatenate(([0], np.cumsum(row['blocks'])))
+                b0, b1 = first // block, -(-last // block)
+                ranges.append((data_start + row['offset'] + int(bounds[b0]), int(bounds[b1] - bounds[b0])))
+                skips.append(first - b0 * block)
+        if periods is None:
+            ranges.append((data_start + first * 8, n * 8))
+
+        chunks = reader.read(ranges)
+        if periods is None:
+            periods = np.frombuffer(chunks.pop(), dtype='int64')
+
+        values = np.empty((len(rows), n))
+        for j, (i, chunk, skip) in enumerate(zip(rows, chunks, skips)):
+            row = header['rows'][i]
+            codec = row.get('codec', 'raw')
+            if codec != 'raw':
+                chunk, parts, pos = bytes(chunk), [], 0
+                for size in row['blocks'][first // row['block']:]:
+                    if pos >= len(chunk):
+                        break
+                    parts.append(decompress(chunk[pos:pos + size], codec))
+                    pos += size
+                chunk = b''.join(parts)
+            values[j] = np.frombuffer(chunk, dtype=row['dtype'], count=n, offset=skip * np.dtype(row['dtype']).itemsize)
+
+        return pd.DataFrame(values, index=[names[i] for i in rows], columns=pd.Index(periods))
+
+    def accounts(self, reader):
+        header, _ = self._read_header(reader)
+        return None if header is None else header['accounts']
+
+    @staticmethod
+    def _step(periods):
+        if periods.size < 2:
+            return None
+        steps = np.diff(periods)
+        return int(steps[0]) if (steps == steps[0]).all() else None
+
+    def _read_header(self, reader):
+        size = reader.size()
+        if size is None:
+            return None, None
+
+        chunk, = reader.read([(0, min(size, self.HEADER_READ))])
+        chunk = bytes(chunk)
+        magic, length = self.PREFIX.unpack_from(chunk)
+        if magic != self.MAGIC:
+            raise ValueError('Not a columnar statement')
+
+        data_start = self.PREFIX.size + length
+        if data_start > len(chunk):
+            chunk += bytes(reader.read([(len(chunk), data_start - len(chunk))])[0])
+
+        return json.loads(chunk[self.PREFIX.size:data_start]), data_start
+
+    def _locate(self, reader, header, data_start, start, end):
+        """
+        Returns the positions of the first and one past the last period in the window,
+        plus the periods of the window when they are known without reading them
+        """
+        n, first_period, step = header['n_periods'], header['start'], header['step']
+
+        if step is not None:
+            first = 0 if start is None else -(-(to_epoch(start) - first_period) // step) # ceil
+            last = n if end is None else (to_epoch(end) - first_period) // step + 1
+            first = int(np.clip(first, 0, n))
+            last = int(np.clip(last, first, n))
+            return first, last, first_period + step * np.arange(first, last, dtype='int64')
+
+        if start is None and end is None:
+            return 0, n, None
+
+        chunk, = reader.read([(data_start, n * 8)])
+        periods = np.frombuffer(chunk, dtype='int64')
+        first = 0 if start is None else int(np.searchsorted(periods, to_epoch(start), 'left'))
+        last = n if end is None else int(np.searchsorted(periods, to_epoch(end), 'right'))
+        last = max(first, last)
+        return first, last, periods[first:last]
+
+def get_statement_store():
+    """
+    Returns an instance of the store named by the `STATEMENT_STORE` setting
+    """
+    path = getattr(settings, 'STATEMENT_STORE', DEFAULT_STATEMENT_STORE)
+    return import_string(path)()
+
+def load_statement(stat, statement, accounts=None, start=None, end=None):
+    """
+    Reads one statement of a `ProjectStatement`, optionally only the given accounts
+    and inclusive window of periods.
+
+    Saved statements are served from the memory-mapped disk cache when it is configured,
+    and written to it on a miss. Otherwise, a statement whose column was deferred is read
+    in byte ranges from the database and one that is loaded is decoded in memory.
+
+    Parameters
+    ----------
+    stat : ProjectStatement
+    statement : str
+        The name of the statement, i.e. 'env', 'istat' or 'roi'
+
+    Returns
+    -------
+    pandas.DataFrame, accounts x epoch seconds, or None if the statement is empty
+    """
+    store = get_statement_store()
+    cache = get_disk_cache()
+    deferred = stat.pk is not None and statement in stat.get_deferred_fields()
+
+    if cache is not None and stat.pk is not None:
+        version = statement_version(stat)
+        df = cache.get(stat.sim_id, stat.frequency, statement, version, accounts, start, end)
+        if df is None:
+            if deferred: # never loads the column onto the instance
+                df = store.read(FieldReader(stat, statement))
+            else:
+                blob = getattr(stat, statement)
+                df = None if blob is None else store.decode(blob)
+            if df is None:
+                return None
+            cache.set(stat.sim_id, stat.frequency, statement, version, df)
+            df = slice_statement(df, accounts=accounts, start=start, end=end)
+        return df
+
+    if deferred:
+        return store.read(FieldReader(stat, statement), accounts=accounts, start=start, end=end)
+
+    blob = getattr(stat, statement)
+    if blob is None:
+        return None
+    return store.decode(blob, accounts=accounts, start=start, end=end)
+
+def statement_accounts(stat, statement):
+    """
+    The account names of one statement of a `ProjectStatement`, from the index of the
+    disk cache or the header of the stored statement, without reading its values
+
+    Returns
+    -------
+    list of str, or None if the statement is empty
+    """
+    store = get_statement_store()
+    cache = get_disk_cache()
+    if cache is not None and stat.pk is not None:
+        accounts = cache.accounts(stat.sim_id, stat.frequency, statement, statement_version(stat))
+        if accounts is not None:
+            return accounts
+
+    if stat.pk is not None and statement in stat.get_deferred_fields():
+        return store.accounts(FieldReader(stat, statement))
+    blob = getattr(stat, statement)
+    return None if blob is None else store.accounts(BytesReader(blob))
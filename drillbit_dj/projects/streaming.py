@@ -0,0 +1,77 @@
+"""
+Incremental JSON encoding of statements, for `StreamingHttpResponse`.
+
+The output matches the JSON of `statement_to_representation`, but is yielded one
+account at a time and, within an account, in chunks of `STATEMENT_STREAM_CHUNK_COLUMNS`
+periods, so memory per request does not grow with the horizon of the statement and
+the first bytes are sent before the rest is encoded. NaNs are encoded as null.
+"""
+import json
+import numpy as np
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .periods import format_labels
+
+DEFAULT_CHUNK_COLUMNS = 4096
+
+def iter_statement_json(df, frequency, statement, chunk_columns=None):
+    """
+    Yields the JSON of a statement as `{"stat": [records], "columns": [...]}`
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        A decoded statement, accounts x epoch seconds
+    frequency : str
+        The frequency of the statement, used to format the period labels
+    statement : str
+        The name of the statement, i.e. 'env', 'istat' or 'roi'
+    chunk_columns : int, optional
+        The number of periods encoded at a time. Default: `STATEMENT_STREAM_CHUNK_COLUMNS`
+    """
+    if df is None:
+        yield b'null'
+        return
+
+    chunk_columns = chunk_columns or getattr(settings, 'STATEMENT_STREAM_CHUNK_COLUMNS', DEFAULT_CHUNK_COLUMNS)
+    columns = df.columns
+    chunks = range(0, len(columns), chunk_columns)
+    index = df.index.name or 'index'
+
+    def labels(start):
+        # formatted a chunk at a time, so the labels of the whole horizon are never held
+        return format_labels(columns[start:start + chunk_columns], frequency, statement).tolist()
+
+    yield b'{"stat": ['
+    for i, (account, values) in enumerate(zip(df.index, df.to_numpy(dtype='float64'))):
+        yield f'{", " if i else ""}{{{json.dumps(index)}: {json.dumps(account)}'.encode()
+        for start in chunks:
+            chunk = values[start:start + chunk_columns].astype(object)
+            chunk[np.isnan(values[start:start + chunk_columns])] = None
+            # encoding a dict in C and dropping its braces is much faster than per value
+            yield b', ' + json.dumps(dict(zip(labels(start), chunk.tolist())))[1:-1].encode()
+        yield b'}'
+
+    yield f'], "columns": {json.dumps([index])[:-1]}'.encode()
+    for start in chunks:
+        yield b', ' + json.dumps(labels(start))[1:-1].encode()
+    yield b']}'
+
+def iter_object_json(fields):
+    """
+    Yields the JSON of an object whose values are either JSON-serializable
+    or iterators of already encoded chunks
+    """
+    yield b'{'
+    for i, (name, value) in enumerate(fields.items()):
+        yield f'{", " if i else ""}{json.dumps(name)}: '.encode()
+        if hasattr(value, '__next__'):
+            yield from value
+        else:
+            yield json.dumps(value, default=str).encode()
+    yield b'}'
+
+def streaming_json_response(chunks, status=200):
+    return StreamingHttpResponse(chunks, status=status, content_type='application/json')
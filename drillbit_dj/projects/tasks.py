@@ -1,6 +1,11 @@
-from celery import shared_task
+from celery import shared_task, chain, group, uuid
+from celery.result import AsyncResult, GroupResult
+from django.conf import settings
 
-from .serializers import ProjectStatementSerializer
+from .locks import queue, dequeue
+from .models import ProjectSimulation
+from .serializers import ProjectStatementSerializer, create_resampled_statements, \
+    create_block_level_statements
 
 """
 WARNING!!!!
@@ -19,11 +24,161 @@ def create_statement_for_given_frequency(sim_id, frequency):
     ser.is_valid()
     ser.save()
 
+@shared_task()
+def create_statements_for_frequencies(sim_id, frequencies):
+    """
+    Resamples the block-level statement to all `frequencies` in a single pass
+    """
+    try:
+        sim = ProjectSimulation.objects.get(pk=sim_id)
+        create_resampled_statements(sim, frequencies)
+    finally:
+        dequeue([('statement', sim_id, f) for f in frequencies])
+
+@shared_task()
+def create_block_level_statement(sim_id):
+    """
+    Creates the block-level statement and summary of a simulation; the environment
+    is built once per worker process, see `build_environment`
+    """
+    sims = ProjectSimulation.objects.filter(pk=sim_id).select_related(
+        'project',
+        'environment__block_schedule',
+        'environment__bitcoin_price',
+        'environment__transaction_fees',
+        'environment__hash_rate',
+    )
+    keys = [('statement', sim_id, '10T')] # its lock is not taken if the statement already exists
+    try:
+        create_block_level_statements(sims)
+    except Exception:
+        # nor is the resample that follows in the pipeline run
+        keys += [('statement', sim_id, f) for f in settings.PERSISTED_FREQUENCIES]
+        raise
+    finally:
+        dequeue(keys)
+
 def create_statements_for_given_project(sim_id):
+    """
+    Only the frequencies in `settings.PERSISTED_FREQUENCIES` are created up front,
+    all by the same task; the others are resampled on request and have no task id.
+    """
+    frequencies = ['H', 'D', 'M', 'Q', 'A']
+    persisted = [f for f in frequencies if f in settings.PERSISTED_FREQUENCIES]
+    task_id = None
+    if persisted:
+        task_id = uuid()
+        queue({('statement', sim_id, f): task_id for f in persisted}, settings.STATEMENT_QUEUE_TIMEOUT)
+        create_statements_for_frequencies.apply_async((sim_id, persisted), task_id=task_id)
+
+    return {f: task_id if f in persisted else None for f in frequencies}
+
+def start_statement_pipeline(sim_ids):
+    """
+    Queues the creation of all statements of each simulation as one Celery canvas: 
+    the block-level statement, then the single-pass resample to the persisted 
+    frequencies. Simulations run in parallel.
+
+    Every task is also recorded in a saved `GroupResult`, the job, so the progress 
+    of all stages can be read back with `job_progress`, and each statement is marked
+    as queued until a worker takes its lock; see `projects.locks.queue`.
+
+    Returns
+    -------
+    tuple of the job id, and {sim_id: {frequency: task_id}} where each frequency maps 
+    to the task after which it is available
+    """
+    frequencies = ['H', 'D', 'M', 'Q', 'A']
+    persisted = [f for f in frequencies if f in settings.PERSISTED_FREQUENCIES]
+
+    pipelines, task_ids, tasks, queued = [], [], {}, {}
+    for sim_id in sim_ids:
+        block_id = uuid()
+        stages = [create_block_level_statement.si(sim_id).set(task_id=block_id)]
+        task_ids.append(block_id)
+
+        resample_id = block_id
+        if persisted:
+            resample_id = uuid()
+            stages.append(create_statements_for_frequencies.si(sim_id, persisted).set(task_id=resample_id))
+            task_ids.append(resample_id)
+
+        pipelines.append(chain(*stages))
+        queued[('statement', sim_id, '10T')] = block_id
+        queued.update((('statement', sim_id, f), resample_id) for f in persisted)
+        tasks[sim_id] = {f: resample_id if f in persisted else block_id for f in frequencies}
+
+    job = GroupResult(uuid(), [AsyncResult(task_id) for task_id in task_ids])
+    job.save()
+    # reported in progress from now on, not only once a worker takes each lock
+    queue(queued, settings.STATEMENT_QUEUE_TIMEOUT)
+    group(pipelines).apply_async()
+
+    return job.id, tasks
+
+def create_statements_locally(sim_ids):
+    """
+    Creates all statements of each simulation in this process, simulating across a
+    local pool of `settings.STATEMENT_PROCESSES` workers; for use without celery
+
+    Returns
+    -------
+    {sim_id: {frequency: None}}, as `start_statement_pipeline` with nothing left to wait for
+    """
     frequencies = ['H', 'D', 'M', 'Q', 'A']
-    tasks = []
-    for frequency in frequencies:
-        task = create_statement_for_given_frequency.delay(sim_id, frequency)
-        tasks.append(task)
+    persisted = [f for f in frequencies if f in settings.PERSISTED_FREQUENCIES]
+
+    sims = ProjectSimulation.objects.filter(pk__in=sim_ids).select_related(
+        'project',
+        'environment__block_schedule',
+        'environment__bitcoin_price',
+        'environment__transaction_fees',
+        'environment__hash_rate',
+    )
+    create_block_level_statements(sims, processes=settings.STATEMENT_PROCESSES)
+    if persisted:
+        for sim in sims:
+            create_resampled_statements(sim, persisted)
+
+    return {sim_id: dict.fromkeys(frequencies) for sim_id in sim_ids}
+
+def resample_statements_locally(sim):
+    """
+    Resamples the block-level statement of `sim` to the persisted frequencies in this
+    process; for use without celery
 
-    return {f: t.id for f, t in zip(frequencies, tasks)}
\ No newline at end of file
+    Returns
+    -------
+    {frequency: None}, as `create_statements_for_given_project` with nothing left to wait for
+    """
+    frequencies = ['H', 'D', 'M', 'Q', 'A']
+    persisted = [f for f in frequencies if f in settings.PERSISTED_FREQUENCIES]
+    if persisted:
+        create_resampled_statements(sim, persisted)
+
+    return dict.fromkeys(frequencies)
+
+def job_progress(job_id):
+    """
+    Returns the state of a job started by `start_statement_pipeline`, and how many of
+    its tasks are done; None if the job is unknown
+    """
+    job = GroupResult.restore(job_id)
+    if job is None:
+        return None
+
+    states = [result.state for result in job.results]
+    if 'FAILURE' in states:
+        state = 'FAILURE'
+    elif all(s == 'SUCCESS' for s in states):
+        state = 'SUCCESS'
+    elif any(s != 'PENDING' for s in states):
+        state = 'STARTED'
+    else:
+        state = 'PENDING'
+
+    return {
+        'state': state,
+        'completed': states.count('SUCCESS'),
+        'total': len(states),
+    }
@@ -1,3 +1,990 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from datetime import datetime, timezone
+from importlib.util import find_spec
+from pathlib import Path
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework import serializers, viewsets
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from drillbit_dj.cache import ByteBudgetLRUCache
+from drillbit_dj.project import ConditionalGetViewSetMixin, SparseFieldsSerializerMixin
+from drillbit_dj.renderers import MessagePackRenderer, ArrowRenderer, FLOAT64_EXT_TYPE
+from projects.accounts import get_account
+from projects.charts import account_datasets, chart_frame, summary_records
+from projects.dependencies import affected_accounts, recompute_statements
+from projects.diskcache import StatementDiskCache
+from projects.locks import single_flight, queue, queued, dequeue
+from projects.preview import lttb, preview_statement
+from projects.periods import labels_to_period_starts, period_starts_to_labels, \
+    format_labels, to_epochs
+from projects.resample import resample_statement
+from projects.status import status_matrix
+from projects.streaming import iter_statement_json
+from projects.storage import NpzStatementStore, ColumnarStatementStore, BytesReader, \
+    slice_statement
+
+class NpzStatementStoreTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.store = NpzStatementStore()
+        self.df = pd.DataFrame(
+            [[1.0, 2.0, 3.0], [10.0, 20.0, 30.0]],
+            index=['Revenue', 'Hash Share'],
+            columns=[1672531200, 1672531800, 1672532400],
+        )
+
+    def test_roundtrip(self):
+        blob = self.store.encode(self.df)
+        self.assertIsInstance(blob, bytes)
+
+        df = self.store.decode(blob)
+        pd.testing.assert_frame_equal(df, self.df)
+        self.assertEqual(df.columns.dtype, np.int64)
+
+    def test_decode_memoryview(self):
+        """
+        Some database backends return BinaryField values as memoryview
+        """
+        blob = memoryview(self.store.encode(self.df))
+        pd.testing.assert_frame_equal(self.store.decode(blob), self.df)
+
+class ColumnarStatementStoreTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.store = ColumnarStatementStore(codec='raw')
+        periods = to_epochs(pd.date_range('2023-01-01', periods=6 * 24 * 10, freq='10T'))
+        self.df = pd.DataFrame(
+            np.arange(3 * periods.size, dtype='float64').reshape(3, -1),
+            index=['Revenue', 'Hash Share', 'Number of Rigs'],
+            columns=periods,
+        )
+
+    def test_roundtrip(self):
+        df = self.store.decode(self.store.encode(self.df))
+        pd.testing.assert_frame_equal(df, self.df)
+
+    def test_accounts(self):
+        self.assertEqual(self.store.accounts(BytesReader(self.store.encode(self.df))), self.df.index.tolist())
+
+    def test_roundtrip_irregular_periods(self):
+        df = self.df.iloc[:, [0, 1, 5, 9]]
+        pd.testing.assert_frame_equal(self.store.decode(self.store.encode(df)), df)
+        pd.testing.assert_frame_equal(
+            self.store.decode(self.store.encode(df), start=df.columns[1], end=df.columns[2]),
+            df.iloc[:, 1:3],
+        )
+
+    def test_slice(self):
+        df = self.store.decode(
+            self.store.encode(self.df), 
+            accounts=['Number of Rigs', 'Unknown', 'Revenue'], 
+            start='2023-01-02', 
+            end='2023-01-03',
+        )
+        expected = slice_statement(self.df, ['Number of Rigs', 'Revenue'], '2023-01-02', '2023-01-03')
+        pd.testing.assert_frame_equal(df, expected)
+        self.assertEqual(df.shape, (2, 6 * 24 + 1))
+
+    def test_compressed_roundtrip(self):
+        store = ColumnarStatementStore(codec='zlib')
+        store.BLOCK_PERIODS = 100
+        blob = store.encode(self.df)
+        self.assertLess(len(blob), len(ColumnarStatementStore(codec='raw').encode(self.df)))
+
+        pd.testing.assert_frame_equal(store.decode(blob), self.df)
+        for start, end in [('2023-01-02', '2023-01-03'), (self.df.columns[100], self.df.columns[199]), ('2024-01-01', None)]:
+            pd.testing.assert_frame_equal(
+                store.decode(blob, accounts=['Revenue'], start=start, end=end),
+                slice_statement(self.df, ['Revenue'], start, end),
+            )
+
+    def test_float32_accounts(self):
+        df = self.df / 3
+        decoded = self.store.decode(self.store.encode(df))
+        np.testing.assert_array_equal(decoded.loc['Revenue'], df.loc['Revenue'])
+        np.testing.assert_allclose(decoded.loc['Hash Share'], df.loc['Hash Share'], rtol=1e-7)
+        self.assertFalse((decoded.loc['Hash Share'] == df.loc['Hash Share']).all())
+
+    def test_reads_only_requested_ranges(self):
+        reader = BytesReader(self.store.encode(self.df))
+        ranges = []
+        read = reader.read
+        reader.read = lambda r: ranges.extend(r) or read(r)
+
+        self.store.read(reader, accounts=['Revenue'], start='2023-01-02', end='2023-01-02 23:50')
+        row_ranges = ranges[1:] # the first read is the header
+        self.assertEqual(row_ranges[0][1], 6 * 24 * 8)
+
+class StatementDiskCacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = StatementDiskCache(tmp.name)
+        periods = to_epochs(pd.date_range('2023-01-01', periods=6 * 24 * 3, freq='10T'))
+        self.df = pd.DataFrame(
+            np.arange(2 * periods.size, dtype='float64').reshape(2, -1),
+            index=['Revenue', 'Number of Rigs'],
+            columns=periods,
+        )
+
+    def test_roundtrip(self):
+        self.assertIsNone(self.cache.get(1, '10T', 'istat', 1))
+        self.cache.set(1, '10T', 'istat', 1, self.df)
+        pd.testing.assert_frame_equal(self.cache.get(1, '10T', 'istat', 1), self.df)
+
+        df = self.cache.get(1, '10T', 'istat', 1, ['Number of Rigs'], '2023-01-02', '2023-01-02 23:50')
+        expected = slice_statement(self.df, ['Number of Rigs'], '2023-01-02', '2023-01-02 23:50')
+        pd.testing.assert_frame_equal(df, expected)
+
+    def test_new_version_replaces_old(self):
+        self.cache.set(1, '10T', 'istat', 1, self.df)
+        self.cache.set(1, '10T', 'istat', 2, self.df * 2)
+        self.assertIsNone(self.cache.get(1, '10T', 'istat', 1))
+        pd.testing.assert_frame_equal(self.cache.get(1, '10T', 'istat', 2), self.df * 2)
+
+        self.cache.evict(1)
+        self.assertIsNone(self.cache.get(1, '10T', 'istat', 2))
+
+    def test_removed_while_reading(self):
+        self.cache.set(1, '10T', 'istat', 1, self.df)
+        (Path(self.cache.root) / '1' / '10T' / 'istat.1.values.npy').unlink()
+        self.assertIsNone(self.cache.get(1, '10T', 'istat', 1))
+
+    def test_prune(self):
+        self.cache.set(1, '10T', 'istat', 1, self.df)
+        self.cache.set(2, '10T', 'istat', 1, self.df)
+        self.cache.set(3, '10T', 'istat', 1, self.df)
+        os.utime(Path(self.cache.root) / '1' / '10T' / 'istat.1.json', (0, 0))
+        os.utime(Path(self.cache.root) / '2' / '10T' / 'istat.1.json', (1, 1))
+
+        size = sum(path.stat().st_size for path in (Path(self.cache.root) / '3' / '10T').iterdir())
+        self.cache.prune(2 * size)
+        self.assertIsNone(self.cache.get(1, '10T', 'istat', 1))
+        self.assertIsNotNone(self.cache.get(2, '10T', 'istat', 1))
+        self.assertIsNotNone(self.cache.get(3, '10T', 'istat', 1))
+
+class StatementPeriodLabelsTestCase(SimpleTestCase):
+
+    def test_block_level_labels(self):
+        labels = ['01-01-23 00:00', '01-01-23 00:10']
+        starts = labels_to_period_starts(labels, '10T', 'istat')
+        self.assertEqual(starts[1], pd.Timestamp('2023-01-01 00:10'))
+        self.assertEqual(period_starts_to_labels(starts, '10T', 'istat').tolist(), labels)
+
+    def test_block_level_roi_labels(self):
+        starts = labels_to_period_starts(['2023-01', '2023-02'], '10T', 'roi')
+        self.assertEqual(starts[1], pd.Timestamp('2023-02-01'))
+
+    def test_month_end_labels(self):
+        labels = ['2023-04-30', '2023-05-31']
+        starts = labels_to_period_starts(labels, 'M')
+        self.assertEqual(starts[0], pd.Timestamp('2023-04-01'))
+        self.assertEqual(period_starts_to_labels(starts, 'M').tolist(), labels)
+
+    def test_epochs(self):
+        epochs = to_epochs(pd.DatetimeIndex(['2023-01-01', '2023-04-01']))
+        self.assertEqual(epochs.tolist(), [1672531200, 1680307200])
+        self.assertEqual(format_labels(epochs, 'Q').tolist(), ['2023-03-31', '2023-06-30'])
+
+class StreamingStatementTestCase(SimpleTestCase):
+
+    def test_matches_records(self):
+        periods = to_epochs(pd.date_range('2023-01-01', periods=10, freq='H'))
+        df = pd.DataFrame(np.arange(20.0).reshape(2, -1), index=['Revenue', 'Hash Share'], columns=periods)
+        df.iloc[1, 3] = np.nan
+
+        streamed = json.loads(b''.join(iter_statement_json(df, 'H', 'istat', chunk_columns=3)))
+
+        expected = df.copy()
+        expected.columns = format_labels(df.columns, 'H', 'istat')
+        expected = expected.reset_index()
+        self.assertEqual(streamed['columns'], expected.columns.tolist())
+        self.assertEqual(streamed['stat'][0], expected.to_dict(orient='records')[0])
+        self.assertIsNone(streamed['stat'][1]['2023-01-01 03H'])
+
+    def test_empty_statement(self):
+        self.assertIsNone(json.loads(b''.join(iter_statement_json(None, 'M', 'roi'))))
+
+class ByteBudgetLRUCacheTestCase(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = ByteBudgetLRUCache(max_bytes=10)
+        cache.set('a', b'12345')
+        cache.set('b', b'12345')
+        cache.get('a')
+        cache.set('c', b'12345')
+
+        self.assertEqual(cache.get('a'), b'12345')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.nbytes, 10)
+
+    def test_ttl(self):
+        cache = ByteBudgetLRUCache(max_bytes=10, ttl=-1)
+        cache.set('a', b'1')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.nbytes, 0)
+
+    def test_oversized_values_are_not_cached(self):
+        cache = ByteBudgetLRUCache(max_bytes=4)
+        cache.set('a', b'12345')
+        self.assertIsNone(cache.get('a'))
+
+class AccountRegistryTestCase(SimpleTestCase):
+
+    def test_undeclared_accounts_are_summed(self):
+        self.assertEqual(get_account('Hash Share').agg, 'mean')
+        self.assertEqual(get_account('Revenue').agg, 'sum')
+        self.assertEqual(get_account('Revenue').dtype, 'float64')
+
+class ResampleStatementTestCase(SimpleTestCase):
+
+    def setUp(self):
+        periods = pd.date_range('2023-01-31 20:00', periods=24 * 6 * 3, freq='10T')
+        self.df = pd.DataFrame(
+            [range(periods.size), range(periods.size), range(periods.size)],
+            index=['Revenue', 'Hash Share', 'Number of Rigs'],
+            columns=to_epochs(periods),
+            dtype='float64',
+        )
+        self.periods = periods
+
+    def expected(self, frequency):
+        data = self.df.T
+        data.index = self.periods
+        return data.resample(frequency).agg({
+            'Revenue': 'sum',
+            'Hash Share': 'mean',
+            'Number of Rigs': 'last',
+        }).T
+
+    def test_cascade_matches_direct_resample(self):
+        resampled = resample_statement(self.df, ['H', 'D', 'M', 'Q', 'A'])
+        self.assertEqual(list(resampled), ['H', 'D', 'M', 'Q', 'A'])
+
+        for frequency, df in resampled.items():
+            expected = self.expected(frequency)
+            self.assertEqual(df.index.tolist(), expected.index.tolist())
+            self.assertEqual(df.columns.tolist(), to_epochs(expected.columns.to_period(frequency).start_time).tolist())
+            self.assertEqual(df.shape, expected.shape)
+            np.testing.assert_allclose(df.to_numpy(), expected.to_numpy())
+
+    def test_nans_are_skipped(self):
+        self.df.iloc[:, 5:20] = np.nan
+        resampled = resample_statement(self.df, ['H'])
+        np.testing.assert_allclose(resampled['H'].to_numpy(), self.expected('H').to_numpy())
+
+    def test_periods(self):
+        resampled = resample_statement(self.df, ['H', 'M'])
+        self.assertEqual(resampled['H'].columns[0], to_epochs(['2023-01-31 20:00'])[0])
+        self.assertEqual(
+            format_labels(resampled['M'].columns, 'M').tolist(), 
+            ['2023-01-31', '2023-02-28']
+        )
+
+class AccountDependencyTestCase(SimpleTestCase):
+
+    def build(self, energy_price, pool_fees, revenue=100):
+        """
+        A block-level statement following the relations declared in `projects.dependencies`
+        """
+        periods = to_epochs(pd.date_range('2023-01-01', periods=6 * 24 * 75, freq='10T'))
+        n = periods.size
+        rng = np.random.default_rng(0)
+        env = pd.DataFrame({
+            'BTC Price': 20000 + rng.random(n) * 1000,
+            'Energy Consumption': 10 + rng.random(n),
+        }).T
+        env.columns = periods
+
+        istat = {
+            'Gross Revenue': revenue + rng.random(n) * 10,
+            'Operating Expenses': np.full(n, 5.0),
+            'Property Tax': np.full(n, 1.0),
+            'Rig Amortization': np.full(n, 3.0),
+            'Infra Amortization': np.full(n, 2.0),
+            'Depreciation for Taxes': np.full(n, 4.0),
+        }
+        istat['Pool Fees'] = istat['Gross Revenue'] * pool_fees
+        istat['Net Revenue'] = istat['Gross Revenue'] - istat['Pool Fees']
+        istat['Energy Expenses'] = env.loc['Energy Consumption'].to_numpy() * energy_price
+        istat['Gross Profit'] = istat['Net Revenue'] - istat['Energy Expenses']
+        istat['Gross Margin'] = istat['Gross Profit'] / istat['Net Revenue']
+        istat['EBITDA'] = istat['Gross Profit'] - istat['Operating Expenses'] - istat['Property Tax']
+        istat['EBIT'] = istat['EBITDA'] - istat['Rig Amortization'] - istat['Infra Amortization']
+        istat['Taxes'] = np.maximum(istat['EBITDA'] - istat['Depreciation for Taxes'], 0) * 0.2
+        istat['Profit, if sold'] = istat['EBIT'] - istat['Taxes']
+        istat['Cash Expenses'] = istat['Energy Expenses'] + istat['Operating Expenses'] + istat['Property Tax'] + istat['Taxes']
+        istat['Operating Cash Flow, if sold'] = istat['Net Revenue'] - istat['Cash Expenses']
+        price = env.loc['BTC Price'].to_numpy()
+        istat['BTC Earned'] = istat['Net Revenue'] / price
+        istat['BTC Converted for Expenses'] = istat['Cash Expenses'] / price
+        istat['BTC, if held'] = np.cumsum(istat['BTC Earned'] - istat['BTC Converted for Expenses'])
+        istat['BTC Value, if held'] = istat['BTC, if held'] * price
+        istat = pd.DataFrame(istat).T
+        istat.columns = periods
+
+        monthly = resample_statement(istat, ['M'])['M']
+        roi = {'Cash Outlays': np.array([-1e6, 0, 0])}
+        roi['Operating Cash Flow, sold'] = monthly.loc['Operating Cash Flow, if sold'].to_numpy()
+        roi['Operating Cash Flow, held'] = roi['Operating Cash Flow, sold'] + monthly.loc['BTC Value, if held'].to_numpy()
+        roi['Net Cash Flow, sold'] = roi['Operating Cash Flow, sold'] + roi['Cash Outlays']
+        roi['Net Cash Flow, held'] = roi['Operating Cash Flow, held'] + roi['Cash Outlays']
+        roi['Cumulative Net, sold'] = np.cumsum(roi['Net Cash Flow, sold'])
+        roi['Cumulative Net, held'] = np.cumsum(roi['Net Cash Flow, held'])
+        roi['ROI, sold'] = roi['Cumulative Net, sold'] / 1e6
+        roi['ROI, held'] = roi['Cumulative Net, held'] / 1e6
+        roi = pd.DataFrame(roi).T
+        roi.columns = monthly.columns
+
+        return {'env': env, 'istat': istat, 'roi': roi}
+
+    def test_affected_accounts(self):
+        affected = [account for _, account in affected_accounts(['pool_fees'])]
+        self.assertEqual(affected[0], 'Pool Fees')
+        self.assertLess(affected.index('Net Revenue'), affected.index('Gross Profit'))
+        self.assertNotIn('Energy Expenses', affected)
+        self.assertIn(('roi', 'ROI, held'), affected_accounts(['energy_price']))
+        self.assertEqual(affected_accounts(['opex']), [])
+
+    def test_recompute_matches_rebuild(self):
+        built = {'energy_price': 0.05, 'pool_fees': 0.02}
+        inputs = {'energy_price': 0.08, 'pool_fees': 0.01}
+        frames = recompute_statements(self.build(**built), built, inputs)
+        expected = self.build(**inputs)
+        for name in ('env', 'istat', 'roi'):
+            pd.testing.assert_frame_equal(frames[name], expected[name], rtol=1e-9)
+
+    def test_taxes_are_clipped(self):
+        # taxable income is negative in some periods before and after the change
+        built = {'energy_price': 8.5, 'pool_fees': 0.02}
+        inputs = {'energy_price': 8.0, 'pool_fees': 0.02}
+        frames = self.build(**built)
+        self.assertTrue((frames['istat'].loc['Taxes'] == 0).any())
+        frames = recompute_statements(frames, built, inputs)
+
+        expected = self.build(**inputs)
+        for name in ('env', 'istat', 'roi'):
+            pd.testing.assert_frame_equal(frames[name], expected[name], rtol=1e-9)
+
+    def test_unknown_tax_rate(self):
+        # no taxable income to fit the tax rate on
+        built = {'energy_price': 0.05, 'pool_fees': 0.02}
+        frames = self.build(revenue=0, **built)
+        self.assertTrue((frames['istat'].loc['Taxes'] == 0).all())
+        self.assertIsNone(recompute_statements(frames, built, {'energy_price': 0.01, 'pool_fees': 0.02}))
+
+    def test_missing_account(self):
+        built = {'energy_price': 0.05, 'pool_fees': 0.02}
+        frames = self.build(**built)
+        frames['istat'] = frames['istat'].drop('Gross Margin')
+        self.assertIsNone(recompute_statements(frames, built, {'energy_price': 0.08, 'pool_fees': 0.02}))
+
+    def test_relation_that_does_not_hold(self):
+        built = {'energy_price': 0.05, 'pool_fees': 0.02}
+        frames = self.build(**built)
+        frames['istat'].loc['Gross Profit'] += np.random.default_rng(1).random(frames['istat'].shape[1])
+        self.assertIsNone(recompute_statements(frames, built, {'energy_price': 0.08, 'pool_fees': 0.02}))
+
+@override_settings(STATEMENT_LOCK_URL=None, STATEMENT_LOCK_TIMEOUT=60, STATEMENT_LOCK_WAIT=0.1)
+class SingleFlightTestCase(SimpleTestCase):
+
+    def test_waits_for_holder(self):
+        calls = []
+        def compute():
+            with single_flight('statement', 1, 'M'):
+                if not calls: # re-checked under the lock, like a saved statement
+                    started.set()
+                    release.wait(1)
+                    calls.append(1)
+
+        started, release = threading.Event(), threading.Event()
+        first = threading.Thread(target=compute)
+        first.start()
+        started.wait(1)
+        with override_settings(STATEMENT_LOCK_WAIT=5):
+            second = threading.Thread(target=compute)
+            second.start()
+            release.set()
+            first.join(), second.join()
+
+        self.assertEqual(calls, [1])
+
+    def test_timeout(self):
+        with single_flight('statement', 1, 'M'):
+            with self.assertRaises(TimeoutError):
+                with single_flight('statement', 1, 'M'):
+                    pass
+            # other keys are not blocked
+            with single_flight('statement', 1, 'Q'):
+                pass
+
+    def test_queued(self):
+        keys = [('statement', 1, '10T'), ('statement', 1, 'M')]
+        queue(dict.fromkeys(keys, 'task'), timeout=60)
+        self.assertEqual(queued(keys + [('statement', 2, 'M')]), set(keys))
+
+        with single_flight('statement', 1, 'M'): # taken by a worker
+            self.assertEqual(queued(keys), {keys[0]})
+
+        queue({keys[1]: 'task'}, timeout=0)
+        self.assertEqual(queued(keys), {keys[0]}) # expired
+
+class AccountDatasetsTestCase(SimpleTestCase):
+
+    def test_datasets(self):
+        jan, feb, mar = 1672531200, 1675209600, 1677628800
+        frames = {
+            'B': pd.DataFrame([[1.0, np.nan]], index=['Revenue'], columns=[jan, feb]),
+            'A': pd.DataFrame([[2.0, 3.0], [4.0, 5.0]], index=['Revenue', 'Taxes'], columns=[feb, mar]),
+        }
+        payload = account_datasets(frames)
+
+        self.assertEqual(payload['labels'], ['2023-01', '2023-02', '2023-03'])
+        self.assertEqual(payload['datasets']['Revenue'], [
+            {'label': 'A', 'data': [None, 2.0, 3.0]},
+            {'label': 'B', 'data': [1.0, 0.0, None]},
+        ])
+        self.assertEqual(payload['datasets']['Taxes'], [{'label': 'A', 'data': [None, 4.0, 5.0]}])
+        json.dumps(payload, allow_nan=False)
+
+    def test_shared_names(self):
+        frames = {
+            2: pd.DataFrame([[1.0]], index=['Revenue'], columns=[1672531200]),
+            1: pd.DataFrame([[2.0]], index=['Revenue'], columns=[1672531200]),
+        }
+        payload = account_datasets(frames, {1: 'Texas', 2: 'Texas'})
+        self.assertEqual(payload['datasets']['Revenue'], [
+            {'label': 'Texas', 'data': [2.0]},
+            {'label': 'Texas', 'data': [1.0]},
+        ])
+
+    def test_empty(self):
+        self.assertEqual(account_datasets({}), {'labels': [], 'datasets': {}})
+
+    def test_chart_frame(self):
+        env = pd.DataFrame([[1.0, np.nan]], index=['BTC Price'], columns=[1, 2])
+        istat = pd.DataFrame([[2.0, 3.0], [9.0, 9.0]], index=['Revenue', 'BTC Price'], columns=[1, 2])
+        df = chart_frame([env, istat, None])
+
+        self.assertEqual(df.index.tolist(), ['BTC Price', 'Revenue'])
+        np.testing.assert_array_equal(df.to_numpy(), [[1.0, 0.0], [2.0, 3.0]])
+
+    def test_summary_records(self):
+        records = summary_records([
+            ('A', {'IRR': 0.1, 'Payback': None}),
+            ('B', {'IRR': 0.2, 'Breakeven': 12}),
+        ])
+        self.assertEqual(records, [
+            {'index': 'IRR', 'A': 0.1, 'B': 0.2},
+            {'index': 'Payback', 'A': 0, 'B': 0},
+            {'index': 'Breakeven', 'A': 0, 'B': 12},
+        ])
+
+@override_settings(REST_FRAMEWORK={'UNAUTHENTICATED_USER': None})
+class ConditionalGetTestCase(SimpleTestCase):
+
+    def setUp(self):
+        updated_at = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        self.serialized = []
+
+        class ViewSet(ConditionalGetViewSetMixin, viewsets.ViewSet):
+            authentication_classes = []
+            permission_classes = []
+
+            def get_version(viewset):
+                return (updated_at, 'fingerprint')
+
+            def list(viewset, request):
+                self.serialized.append(1)
+                return Response({'a': 1})
+
+        self.view = ViewSet.as_view({'get': 'list'})
+        self.factory = APIRequestFactory()
+
+    def test_etag(self):
+        response = self.view(self.factory.get('/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], 'Sun, 01 Jan 2023 00:00:00 GMT')
+        self.assertEqual(response['Vary'], 'Accept')
+
+        response = self.view(self.factory.get('/', HTTP_IF_NONE_MATCH=response['ETag']))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(self.serialized), 1)
+
+        response = self.view(self.factory.get('/', HTTP_IF_NONE_MATCH='"stale"'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        response = self.view(self.factory.get('/', HTTP_IF_MODIFIED_SINCE='Sun, 01 Jan 2023 00:00:00 GMT'))
+        self.assertEqual(response.status_code, 304)
+
+        response = self.view(self.factory.get('/', HTTP_IF_MODIFIED_SINCE='Sat, 31 Dec 2022 00:00:00 GMT'))
+        self.assertEqual(response.status_code, 200)
+
+class StatusMatrixTestCase(SimpleTestCase):
+
+    def test_states(self):
+        built = datetime(2023, 1, 2, tzinfo=timezone.utc)
+        sim = {
+            'id': 1,
+            'inputs': {'energy_price': 0.05},
+            'updated_at': datetime(2023, 1, 1, tzinfo=timezone.utc),
+            'statements': {'10T': ({'energy_price': 0.05}, built), 'M': ({}, built)},
+        }
+        stale = {**sim, 'id': 2, 'inputs': {'energy_price': 0.06}}
+        sims = {('1', '1'): sim, ('1', '2'): stale}
+
+        matrix = status_matrix([1], [1, 2, 3], ['M', 'D', 'Q'], sims, ['M', 'Q'], {(2, 'Q')})
+        self.assertEqual([cell['statements'] for cell in matrix], [
+            {'M': 'ready', 'D': 'ready', 'Q': 'missing'},
+            {'M': 'stale', 'D': 'stale', 'Q': 'in_progress'},
+            {'M': 'no_simulation', 'D': 'no_simulation', 'Q': 'no_simulation'},
+        ])
+        self.assertEqual([cell['sim'] for cell in matrix], [1, 2, None])
+
+class SparseFieldsTestCase(SimpleTestCase):
+
+    def setUp(self):
+        class ChildSerializer(SparseFieldsSerializerMixin, serializers.Serializer):
+            a = serializers.IntegerField()
+            b = serializers.IntegerField()
+
+        class ParentSerializer(SparseFieldsSerializerMixin, serializers.Serializer):
+            a = serializers.IntegerField()
+            b = serializers.IntegerField()
+            children = ChildSerializer(many=True)
+
+        self.serializer_class = ParentSerializer
+        self.obj = {'a': 1, 'b': 2, 'children': [{'a': 3, 'b': 4}]}
+
+    def test_fields(self):
+        data = self.serializer_class(self.obj, fields=['a', 'children']).data
+        self.assertEqual(data, {'a': 1, 'children': [{'a': 3, 'b': 4}]})
+
+    def test_omit(self):
+        data = self.serializer_class([self.obj], many=True, omit=['children']).data
+        self.assertEqual([dict(row) for row in data], [{'a': 1, 'b': 2}])
+
+    def test_query_params(self):
+        request = APIRequestFactory().get('/', {'fields': 'a,b', 'omit': 'b'})
+        data = self.serializer_class(self.obj, context={'request': Request(request)}).data
+        self.assertEqual(data, {'a': 1})
+
+class BinaryRendererTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.data = {
+            'expected_loss': 1.5,
+            'data': [{'temp': 90, 'loss': 0.5}, {'temp': 95, 'loss': None}],
+        }
+
+    @unittest.skipUnless(find_spec('msgpack'), 'needs msgpack')
+    def test_messagepack(self):
+        import msgpack
+
+        data = msgpack.unpackb(MessagePackRenderer().render(self.data))
+        self.assertEqual(data['expected_loss'], 1.5)
+        self.assertEqual(data['data']['temp'], [90, 95])
+
+        loss = data['data']['loss']
+        self.assertEqual(loss.code, FLOAT64_EXT_TYPE)
+        np.testing.assert_array_equal(np.frombuffer(loss.data, dtype='<f8'), [0.5, np.nan])
+
+    @unittest.skipUnless(find_spec('pyarrow'), 'needs pyarrow')
+    def test_arrow(self):
+        import pyarrow as pa
+
+        table = pa.ipc.open_stream(ArrowRenderer().render(self.data)).read_all()
+        self.assertEqual(table.column('temp').to_pylist(), [90, 95])
+        self.assertEqual(table.column('loss').to_pylist(), [0.5, None])
+        self.assertEqual(json.loads(table.schema.metadata[b'expected_loss']), 1.5)
+
+class PreviewTestCase(SimpleTestCase):
+
+    def test_keeps_extremes(self):
+        x = np.arange(1000)
+        y = np.zeros((2, 1000))
+        y[0, 500] = 10
+        y[1, 250] = -5
+        y[1, 600] = np.nan
+        selected = lttb(x, y, 10)
+
+        self.assertEqual(selected.shape, (2, 10))
+        self.assertEqual(selected[:, 0].tolist(), [0, 0])
+        self.assertEqual(selected[:, -1].tolist(), [999, 999])
+        self.assertIn(500, selected[0])
+        self.assertIn(250, selected[1])
+        self.assertNotIn(600, selected[1])
+        self.assertTrue((np.diff(selected, axis=1) > 0).all())
+
+    def test_short_statement(self):
+        df = pd.DataFrame([[1.0, 2.0, 3.0]], index=['Revenue'], columns=[0, 600, 1200])
+        epochs, values = preview_statement(df, 100)['Revenue']
+        self.assertEqual(epochs.tolist(), [0, 600, 1200])
+        self.assertEqual(values.tolist(), [1.0, 2.0, 3.0])
+
+def create_environment(name='Base', price=1):
+    """
+    An environment with constant schedules, saved
+    """
+    from environment.models import BlockSchedule, BitcoinPrice, TransactionFees, HashRate, Environment
+
+    blocks = BlockSchedule.objects.create(start_date='2023-01-31', last_epoch=1, json='[]')
+    schedules = {
+        name: model.objects.create(blocks=blocks, model='Constant', initial=initial, json=json.dumps([initial]))
+        for name, model, initial in [
+            ('bitcoin_price', BitcoinPrice, price),
+            ('transaction_fees', TransactionFees, 1),
+            ('hash_rate', HashRate, 1),
+        ]
+    }
+    return Environment.objects.create(name=name, block_schedule=blocks, **schedules)
+
+def encoded_statement(value=1.0):
+    from projects.storage import get_statement_store
+
+    periods = pd.date_range('2023-01-31 20:00', periods=24 * 6, freq='10T')
+    df = pd.DataFrame([np.full(periods.size, value)], index=['Revenue'], columns=to_epochs(periods), dtype='float64')
+    return get_statement_store().encode(df)
+
+@override_settings(STATEMENT_DATA_DIR=None)
+class ResampledStatementViewTestCase(TestCase):
+
+    def setUp(self):
+        from projects.models import Project, ProjectSimulation, ProjectStatement
+
+        project = Project.objects.create(name='Texas')
+        self.sim = ProjectSimulation.objects.create(environment=create_environment(), project=project)
+        self.block = ProjectStatement.objects.create(
+            sim=self.sim, frequency='10T', env=encoded_statement(), istat=encoded_statement(), roi=None,
+        )
+
+    def test_list(self):
+        response = self.client.get(
+            '/projects/statement/', {'sim': self.sim.id, 'frequency': 'H', 'fields': 'sim,frequency,istat'},
+        )
+        self.assertEqual(response.status_code, 200)
+        statements = response.json()
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(statements[0]['frequency'], 'H')
+        self.assertEqual(statements[0]['sim'], self.sim.id)
+        self.assertIsNotNone(statements[0]['istat'])
+
+    def test_income_statement(self):
+        response = self.client.get(f'/projects/statement/{self.block.id}/income_statement/', {'frequency': 'H'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], self.client.get(f'/projects/statement/{self.block.id}/income_statement/')['ETag'])
+
+    def test_retrieve(self):
+        response = self.client.get(f'/projects/statement/{self.block.id}/', {'frequency': 'H', 'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['frequency'], 'H')
+
+        response = self.client.get(f'/projects/statement/{self.block.id}/', {'frequency': 'M'})
+        self.assertEqual(response.status_code, 404) # not saved yet
+
+    def test_preview_cached(self):
+        from projects.serializers import statement_preview
+
+        first = statement_preview(self.block, 'istat', 10)
+        self.assertEqual([preview['account'] for preview in first], ['Revenue'])
+        with mock.patch('projects.serializers.load_statement') as load_statement:
+            self.assertEqual(statement_preview(self.block, 'istat', 10), first)
+        load_statement.assert_not_called()
+
+@override_settings(STATEMENT_DATA_DIR=None)
+class StatementFingerprintTestCase(TestCase):
+
+    def setUp(self):
+        from projects.models import Project, ProjectSimulation
+
+        environment = create_environment()
+        self.sims = {
+            name: ProjectSimulation.objects.create(
+                environment=environment,
+                project=Project.objects.create(name=name, energy_price=energy_price),
+            )
+            for name, energy_price in [('A', 0.05), ('B', 0.05), ('C', 0.06)]
+        }
+
+    def fingerprint(self, name):
+        from projects.fingerprint import simulation_fingerprint
+        from projects.models import ProjectSimulation
+
+        return simulation_fingerprint(ProjectSimulation.objects.get(pk=self.sims[name].pk))
+
+    def test_stable(self):
+        self.assertEqual(self.fingerprint('A'), self.fingerprint('A'))
+        self.assertEqual(self.fingerprint('A'), self.fingerprint('B')) # names are not inputs
+        self.assertNotEqual(self.fingerprint('A'), self.fingerprint('C'))
+
+    def test_environment_edit(self):
+        before = self.fingerprint('A')
+        price = self.sims['A'].environment.bitcoin_price
+        price.json = json.dumps([2])
+        price.save()
+        self.assertNotEqual(self.fingerprint('A'), before)
+
+    def test_copy(self):
+        from projects.models import ProjectStatement, ProjectStatementSummary
+        from projects.serializers import copy_statements_by_fingerprint
+
+        source = self.sims['A']
+        for frequency in ('10T', 'M'):
+            ProjectStatement.objects.create(
+                sim=source, frequency=frequency, env=encoded_statement(), istat=encoded_statement(2.0), roi=None,
+                fingerprint=self.fingerprint('A') if frequency == '10T' else '',
+            )
+        ProjectStatementSummary.objects.create(sim=source, summary={'IRR': 0.1})
+
+        copied = copy_statements_by_fingerprint(self.sims['B'], self.fingerprint('B'))
+        self.assertEqual(copied.sim_id, self.sims['B'].id)
+        self.assertEqual(bytes(copied.istat), encoded_statement(2.0))
+        self.assertEqual(ProjectStatement.objects.filter(sim=self.sims['B']).count(), 2)
+        self.assertEqual(ProjectStatementSummary.objects.get(sim=self.sims['B']).summary, {'IRR': 0.1})
+
+        self.assertIsNone(copy_statements_by_fingerprint(self.sims['C'], self.fingerprint('C')))
+        self.assertFalse(ProjectStatement.objects.filter(sim=self.sims['C']).exists())
+
+def simulated(project, env, blocks):
+    return encoded_statement(), encoded_statement(project.energy_price), None, {'energy_price': project.energy_price}
+
+@override_settings(STATEMENT_DATA_DIR=None, STATEMENT_LOCK_URL=None)
+class CreateBlockLevelStatementsTestCase(TestCase):
+
+    def setUp(self):
+        from projects.models import Project, ProjectSimulation
+        from projects.serializers import environment_cache
+
+        environment_cache.clear()
+        environments = [create_environment('Low', price=1), create_environment('High', price=2)]
+        projects = [
+            Project.objects.create(name=name, energy_price=energy_price)
+            for name, energy_price in [('A', 0.05), ('B', 0.05), ('C', 0.06)]
+        ]
+        self.sims = [
+            ProjectSimulation.objects.create(environment=environment, project=project)
+            for environment in environments
+            for project in projects
+        ]
+
+    def create(self):
+        from projects.models import ProjectSimulation
+        from projects.serializers import create_block_level_statements
+
+        sims = ProjectSimulation.objects.filter(pk__in=[sim.pk for sim in self.sims]).order_by('pk')
+        return create_block_level_statements(sims)
+
+    @mock.patch('projects.serializers.simulate_project', side_effect=simulated)
+    @mock.patch('projects.serializers._build_environment', return_value=(None, None, 0))
+    def test_batch(self, build, simulate):
+        from projects.models import ProjectStatementSummary
+
+        stats = self.create()
+        self.assertEqual(build.call_count, 2) # once per environment
+        self.assertEqual(simulate.call_count, 4) # A and B share their inputs
+
+        self.assertEqual([stat.sim_id for stat in stats], [sim.id for sim in self.sims])
+        for sim, stat in zip(self.sims, stats):
+            self.assertEqual(bytes(stat.istat), encoded_statement(sim.project.energy_price))
+            self.assertEqual(
+                ProjectStatementSummary.objects.get(sim=sim).summary,
+                {'energy_price': sim.project.energy_price},
+            )
+
+        self.create()
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(simulate.call_count, 4) # nothing left to simulate
+
+class EnvironmentCacheTestCase(TestCase):
+
+    def setUp(self):
+        from projects.serializers import environment_cache
+
+        environment_cache.clear()
+        self.environment = create_environment()
+
+    def build(self):
+        from environment.models import Environment
+        from projects.serializers import build_environment
+
+        return build_environment(Environment.objects.get(pk=self.environment.pk))
+
+    @mock.patch('projects.serializers._build_environment', return_value=(None, None, 0))
+    def test_schedule_edit(self, build):
+        from projects.fingerprint import environment_version
+
+        before = environment_version(self.environment)
+        self.build()
+        self.build()
+        self.assertEqual(build.call_count, 1)
+
+        price = self.environment.bitcoin_price
+        price.json = json.dumps([2])
+        price.save()
+        self.environment.refresh_from_db()
+        self.assertGreater(environment_version(self.environment), before)
+
+        self.build()
+        self.assertEqual(build.call_count, 2)
+
+    @mock.patch('projects.serializers._build_environment', return_value=(None, None, 0))
+    def test_cache_stats(self, build):
+        self.build()
+        self.build()
+
+        response = self.client.get('/projects/statement/cache_stats/')
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        self.assertEqual(
+            set(stats),
+            {'environments', 'statements', 'charts', 'previews', 'fingerprints'},
+        )
+        self.assertEqual(stats['environments']['entries'], 1)
+        self.assertGreaterEqual(stats['environments']['hits'], 1)
+
+@override_settings(PERSISTED_FREQUENCIES=['M'], STATEMENT_LOCK_URL=None)
+class StatementPipelineTestCase(SimpleTestCase):
+
+    @mock.patch('projects.tasks.GroupResult')
+    @mock.patch('projects.tasks.group')
+    def test_canvas(self, group, GroupResult):
+        from projects.tasks import start_statement_pipeline
+
+        GroupResult.return_value.id = 'job'
+        job_id, tasks = start_statement_pipeline([1, 2])
+        self.assertEqual(job_id, 'job')
+
+        (pipelines,), _ = group.call_args
+        self.assertEqual(len(pipelines), 2)
+        task_ids = []
+        for sim_id, pipeline in zip([1, 2], pipelines):
+            block, resample = pipeline.tasks
+            self.assertEqual(block.task, 'projects.tasks.create_block_level_statement')
+            self.assertEqual(tuple(block.args), (sim_id,))
+            self.assertEqual(resample.task, 'projects.tasks.create_statements_for_frequencies')
+            self.assertEqual(tuple(resample.args), (sim_id, ['M']))
+
+            block_id, resample_id = block.options['task_id'], resample.options['task_id']
+            self.assertEqual(tasks[sim_id], {'H': block_id, 'D': block_id, 'M': resample_id, 'Q': block_id, 'A': block_id})
+            task_ids += [block_id, resample_id]
+        group.return_value.apply_async.assert_called_once_with()
+
+        _, results = GroupResult.call_args.args
+        self.assertEqual([result.id for result in results], task_ids)
+        GroupResult.return_value.save.assert_called_once_with()
+
+        keys = [('statement', sim_id, f) for sim_id in [1, 2] for f in ['10T', 'M']]
+        self.assertEqual(queued(keys), set(keys))
+        dequeue(keys)
+
+    def test_job_progress(self):
+        from projects.tasks import job_progress
+
+        for states, state in [
+            (['PENDING', 'PENDING'], 'PENDING'),
+            (['SUCCESS', 'PENDING'], 'STARTED'),
+            (['STARTED', 'PENDING'], 'STARTED'),
+            (['SUCCESS', 'FAILURE'], 'FAILURE'),
+            (['SUCCESS', 'SUCCESS'], 'SUCCESS'),
+        ]:
+            job = mock.Mock(results=[mock.Mock(state=s) for s in states])
+            with mock.patch('projects.tasks.GroupResult.restore', return_value=job):
+                self.assertEqual(
+                    job_progress('job'),
+                    {'state': state, 'completed': states.count('SUCCESS'), 'total': 2},
+                )
+
+        with mock.patch('projects.tasks.GroupResult.restore', return_value=None):
+            self.assertIsNone(job_progress('unknown'))
+
+# module level, so the pool can pickle them by reference
+def simulated_by_id(sim_id):
+    return encoded_statement(), encoded_statement(float(sim_id)), None, {'sim': sim_id}
+
+def failed_by_id(sim_id):
+    raise ValueError(sim_id)
+
+# TransactionTestCase, as `simulate_many` closes the connections before starting its pool
+@override_settings(STATEMENT_DATA_DIR=None, STATEMENT_LOCK_URL=None)
+class SimulateManyTestCase(TransactionTestCase):
+
+    def setUp(self):
+        from projects.models import Project, ProjectSimulation
+
+        environment = create_environment()
+        self.sims = [
+            ProjectSimulation.objects.create(
+                environment=environment,
+                project=Project.objects.create(name=str(energy_price), energy_price=energy_price),
+            )
+            for energy_price in [0.04, 0.05, 0.06]
+        ]
+
+    @mock.patch('projects.serializers._simulate_by_id', simulated_by_id)
+    def test_processes(self):
+        from projects.models import ProjectStatementSummary
+        from projects.serializers import simulate_many, create_block_level_statements
+
+        results = simulate_many(self.sims, processes=2)
+        self.assertEqual([summary['sim'] for *_, summary in results], [sim.id for sim in self.sims])
+
+        stats = create_block_level_statements(self.sims, processes=2)
+        for sim, stat in zip(self.sims, stats):
+            self.assertEqual(stat.sim_id, sim.id)
+            self.assertEqual(bytes(stat.istat), encoded_statement(float(sim.id)))
+            self.assertEqual(ProjectStatementSummary.objects.get(sim=sim).summary, {'sim': sim.id})
+
+    @mock.patch('projects.serializers._simulate_by_id', failed_by_id)
+    def test_failure(self):
+        from projects.models import ProjectStatement, ProjectStatementSummary
+        from projects.serializers import create_block_level_statements
+
+        with self.assertRaises(ValueError):
+            create_block_level_statements(self.sims, processes=2)
+        self.assertFalse(ProjectStatement.objects.exists())
+        self.assertFalse(ProjectStatementSummary.objects.exists())
+
+@override_settings(PERSISTED_FREQUENCIES=['M'], STATEMENT_LOCK_URL=None)
+class StatementStatusTestCase(TestCase):
+
+    def setUp(self):
+        from projects.models import Project, ProjectSimulation
+
+        self.sim = ProjectSimulation.objects.create(
+            environment=create_environment(), project=Project.objects.create(name='Texas'),
+        )
+
+    def states(self):
+        from projects.serializers import statement_status
+
+        matrix = statement_status([self.sim.environment_id], [self.sim.project_id], ['H', 'M'])
+        return matrix[0]['statements']
+
+    def test_queued(self):
+        from projects.status import IN_PROGRESS, MISSING
+
+        self.assertEqual(self.states(), {'H': MISSING, 'M': MISSING})
+
+        keys = [('statement', self.sim.id, f) for f in ['10T', 'M']]
+        queue(dict.fromkeys(keys, 'task'), timeout=60)
+        self.assertEqual(self.states(), {'H': IN_PROGRESS, 'M': IN_PROGRESS})
+
+        with single_flight(*keys[0]): # the block-level statement is being computed
+            self.assertEqual(self.states(), {'H': IN_PROGRESS, 'M': IN_PROGRESS})
+        self.assertEqual(self.states(), {'H': MISSING, 'M': IN_PROGRESS}) # the resample has not started
+
+        dequeue(keys)
+        self.assertEqual(self.states(), {'H': MISSING, 'M': MISSING})
@@ -13,7 +13,8 @@ router.register('summary', views.ProjectStatementSummaryViewSet, basename='proje
 router.register('projects', views.ProjectsViewSet, basename='projects')
 
 urlpatterns = [
-    path('tasks/<str:task_id>/', views.get_progress, name='task-status')
+    path('tasks/<str:task_id>/', views.get_progress, name='task-status'),
+    path('jobs/<str:job_id>/', views.get_job_progress, name='job-status'),
 ]
 
 urlpatterns += router.urls
\ No newline at end of file
@@ -1,24 +1,36 @@
 import json
-import pandas as pd
 
 from celery.result import AsyncResult
-from django.http import HttpResponse
-from django.db.models import ProtectedError
+from django.conf import settings
+from django.http import HttpResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.db.models import ProtectedError, Count, Max
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend, filterset
 from rest_framework import filters
 
+from drillbit_dj.project import ConditionalGetViewSetMixin, SparseFieldsViewSetMixin
+from drillbit_dj.renderers import MESSAGEPACK_RENDERER_CLASSES, NUMERIC_RENDERER_CLASSES, is_binary
+
 
 from .models import RigForProject, InfraForProject, Project, Projects, \
-    ProjectSimulation, ProjectStatement, ProjectStatementSummary
+    ProjectSimulation, ProjectStatement, ProjectStatementSummary, StatementValue
 from .serializers import RigForProjectSerializer, InfraForProjectSerializer, ProjectSerializer, \
     ProjectsSerializer, ProjectScalingSerializer, ProjectCostsSerializer, \
     ProjectSimulationSerializer, ProjectStatementSerializer, \
-    ProjectStatementSummarySerializer
-from .tasks import create_statements_for_given_project
-from environment.models import Environment
+    ProjectStatementSummarySerializer, statement_to_representation, statement_to_columns, update_block_level_statement, \
+    environment_cache, statement_cache, chart_cache, projects_by_account, statement_status, \
+    statement_preview, preview_cache, get_statement, resampled_statement
+from .storage import load_statement
+from .fingerprint import environment_inputs_cache
+from .charts import summary_records
+from .status import READY, STALE
+from .diskcache import evict_statement_data
+from .streaming import iter_statement_json, iter_object_json, streaming_json_response
+from .tasks import create_statements_for_given_project, \
+    start_statement_pipeline, create_statements_locally, resample_statements_locally, job_progress
 
 class RigForProjectViewSet(viewsets.ModelViewSet):
     serializer_class = RigForProjectSerializer
@@ -28,9 +40,10 @@ class InfraForProjectViewSet(viewsets.ModelViewSet):
     serializer_class = InfraForProjectSerializer
     queryset = InfraForProject.objects.all()
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     queryset = Project.objects.all()
+    deferrable_fields = ('target_ambient_temp',)
 
     def update(self, request, *args, **kwargs):
         # want to return updated data; the original serializer will not do that   
@@ -46,9 +59,11 @@ class ProjectViewSet(viewsets.ModelViewSet):
             project.delete()
         except ProtectedError as e:
             sims = ProjectSimulation.objects.filter(project=project)
+            sim_ids = list(sims.values_list('id', flat=True))
             ProjectStatement.objects.filter(sim__in=sims).delete()
             ProjectStatementSummary.objects.filter(sim__in=sims).delete()
             sims.delete()
+            evict_statement_data(sim_ids)
             project.delete()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -87,12 +102,55 @@ class ProjectSimulationViewSet(viewsets.ModelViewSet):
         sims = ProjectSimulation.objects.filter(id__in=sim_ids)
         ProjectStatement.objects.filter(sim__in=sims).delete()
         ProjectStatementSummary.objects.filter(sim__in=sims).delete()
+        evict_statement_data(sim_ids)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-class ProjectStatementViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], name='Recompute statements')
+    def recompute_statements(self, request, *args, **kwargs):
+        """
+        Brings the statements of each simulation up to date after its project was edited.
+
+        Where only the financial inputs of the project changed, the affected accounts 
+        are recomputed on top of the stored block-level statement and the summary is
+        marked stale. Otherwise the statements are deleted and rebuilt
+        from scratch by the same pipeline as `ProjectStatementViewSet.create`.
+
+        Returns the job and the tasks created for each simulation, as `ProjectStatementViewSet.create`
+        """
+        sim_ids = request.data if isinstance(request.data, list) else [request.data]
+        sims = ProjectSimulation.objects.filter(id__in=sim_ids).select_related('project', 'environment')
+
+        tasks, rebuilt = {}, []
+        for sim in sims:
+            block = ProjectStatement.objects.filter(sim=sim, frequency='10T').exists()
+            if block and update_block_level_statement(sim):
+                if settings.STATEMENT_WORKERS == 'celery':
+                    tasks[sim.id] = create_statements_for_given_project(sim.id)
+                else:
+                    tasks[sim.id] = resample_statements_locally(sim)
+            else:
+                ProjectStatement.objects.filter(sim=sim).delete()
+                ProjectStatementSummary.objects.filter(sim=sim).delete()
+                rebuilt.append(sim.id)
+
+        job_id = None
+        if rebuilt:
+            if settings.STATEMENT_WORKERS == 'celery':
+                job_id, rebuilt_tasks = start_statement_pipeline(rebuilt)
+            else:
+                rebuilt_tasks = create_statements_locally(rebuilt)
+            tasks.update(rebuilt_tasks)
+
+        return Response({'job_id': job_id, 'tasks': tasks})
+
+class ProjectStatementViewSet(ConditionalGetViewSetMixin, SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     serializer_class = ProjectStatementSerializer
     queryset = ProjectStatement.objects.all()
+    # statements are only listed with their metadata, unless requested with `?fields=`
+    deferrable_fields = ('env', 'istat', 'roi', 'inputs')
+    list_fields = ('id', 'name', 'sim', 'project', 'environment', 'frequency')
+    renderer_classes = MESSAGEPACK_RENDERER_CLASSES
     filter_backends = [DjangoFilterBackend]
     filterset_fields = {
         'sim': ['in', 'exact'], # note the 'in' field
@@ -115,12 +173,17 @@ class ProjectStatementViewSet(viewsets.ModelViewSet):
             + from the list of simulation ids, a new data structure is created that 
             contains the simulation id and the frequency, so that serializer can validate the data
 
-        The base block-level statement is created for each simulation along with the 
-        summary statement, inside the serializer. The remaining statements for 
-        periods ['H', 'D', 'M', 'Q', 'A'] are create asynchronously via celery tasks.
+        All statements are created asynchronously by a celery pipeline per simulation: the 
+        base block-level statement and the summary statement, then the statements for
+        the periods in `settings.PERSISTED_FREQUENCIES`; see `start_statement_pipeline`.
+        Without celery, i.e. `settings.STATEMENT_WORKERS = 'processes'`, they are created 
+        in the request across a local process pool, and there is no job or tasks.
+        The other periods in ['H', 'D', 'M', 'Q', 'A'] are never saved: once the block-level
+        statement exists, they are resampled from it when read; see `list` and `get_object`.
 
-        The method returns a dictionary of the task ids for each simulation so the status can be 
-        monitored by the client separately.
+        The method returns immediately with the id of the job, whose progress over every
+        stage is available from `jobs/<job_id>/`, and the task after which each frequency 
+        of each simulation is available, so the status can be monitored by the client.
 
         Parameters
         ----------
@@ -130,7 +193,7 @@ class ProjectStatementViewSet(viewsets.ModelViewSet):
 
         Return
         --------
-        A dictionary of simulation ids and the tasks that were created for each simulation
+        A dictionary with the `job_id`, and the `tasks` of each simulation and frequency
         """
         
         if not isinstance(request.data, list):
@@ -145,16 +208,16 @@ class ProjectStatementViewSet(viewsets.ModelViewSet):
         
         serializer = self.get_serializer(data=data, many=isinstance(data, list))
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
 
-        tasks = {}
-        for sim_id in request.data:
-            sim_tasks = create_statements_for_given_project(sim_id)
-            tasks[sim_id] = sim_tasks
+        sim_ids = [d['sim'].pk for d in serializer.validated_data]
+        if settings.STATEMENT_WORKERS == 'celery':
+            job_id, tasks = start_statement_pipeline(sim_ids)
+        else:
+            job_id, tasks = None, create_statements_locally(sim_ids)
 
         return Response(
-            tasks,
-            status=status.HTTP_201_CREATED, 
+            {'job_id': job_id, 'tasks': tasks},
+            status=status.HTTP_202_ACCEPTED, 
         )
 
     @action(detail=False, methods=['get'], name='Check Statement Exists')
@@ -162,124 +225,283 @@ class ProjectStatementViewSet(viewsets.ModelViewSet):
         environment = request.query_params.get('environment', None)
         projects = request.GET.getlist('projects[]', None)
         frequency = request.query_params.get('frequency', 'M')
-        
-        try:
-            environment = Environment.objects.get(pk=environment)
-        except Environment.DoesNotExist:
-            return Response(False)
 
-        proj_objs = Project.objects.filter(pk__in=projects)
-        if proj_objs.count() != len(projects):
-            return Response(False)
+        matrix = statement_status([environment], projects, [frequency])
+        return Response(bool(projects) and all(cell['statements'][frequency] in (READY, STALE) for cell in matrix))
 
-        sims = ProjectSimulation.objects.filter(environment=environment, project__in=proj_objs)
-        if sims.count() != len(projects):
-            return Response(False)
+    @action(detail=False, methods=['get'], name='Statement Status')
+    def status(self, request, *args, **kwargs):
+        """
+        The state of the statements of each pair of `environments[]` and `projects[]`
+        at each of `frequencies[]`, all frequencies by default: 'ready', 'stale' if
+        the project changed since they were built, 'in_progress', 'missing', or
+        'no_simulation'
+        """
+        environments = request.GET.getlist('environments[]', None)
+        projects = request.GET.getlist('projects[]', None)
+        frequencies = request.GET.getlist('frequencies[]', None)
 
-        stats = ProjectStatement.objects.filter(sim__in=sims, frequency=frequency)
-        if stats.count() != len(projects):
-            return Response(False)
+        return Response(statement_status(environments, projects, frequencies or None))
 
-        return Response(True)
+    @action(detail=False, methods=['get'], name='Cache Statistics')
+    def cache_stats(self, request, *args, **kwargs):
+        """
+        Hit and miss counts and sizes of the in-process caches of this worker
+        """
+        return Response({
+            'environments': environment_cache.stats(),
+            'statements': statement_cache.stats(),
+            'charts': chart_cache.stats(),
+            'previews': preview_cache.stats(),
+            'fingerprints': environment_inputs_cache.stats(),
+        })
 
     @action(detail=False, methods=['get'], name='Project Statement Accounts')
     def projects_by_account(self, request, *args, **kwargs):
         environment = request.query_params.get('environment', None) 
         projects = request.GET.getlist('projects[]', None)
         frequency = request.query_params.get('frequency', 'M')
+        accounts = request.GET.getlist('accounts[]', None)
 
-        projects = Project.objects.filter(pk__in=projects)
-        project_dfs = []
-        for project in projects:
-            sim = ProjectSimulation.objects.get(environment=environment, project=project.id)
-            data = {
-                'sim': sim.id,
-                'frequency': frequency
-            }
-            ser = ProjectStatementSerializer(data=data)
-            ser.is_valid()
-            ser.save()
-
-            env = ser.data['env']
-            roi = ser.data['roi']
-            istat = ser.data['istat']
-            df = pd.concat((
-                pd.DataFrame(env['stat']).set_index('index'),
-                pd.DataFrame(istat['stat']).set_index('index'),
-                pd.DataFrame(roi['stat']).set_index('index') if roi else None,
-            )).fillna(0)
-            project_dfs.append(df)
-
-        df = pd.concat(
-            project_dfs,
-            keys=list(projects.values_list('name', flat=True)),
-            names=['Project', 'Account']
-        ) \
-        .reorder_levels([1,0]) \
-        .sort_index()
-
-        df.columns = pd.to_datetime(df.columns)
-        df = df.T.sort_index().T
-        df.columns = df.columns.strftime('%Y-%m')
-
-        response = {
-            'labels': df.columns,
-            'datasets': {}
-        }
-
-        for account, name in df.index:
-            if account not in response['datasets']:
-                response['datasets'][account] = []
-            
-            dataset = {
-                'label': name,
-                'data': df.loc[(account, name)].values.tolist()
-            }
-            response['datasets'][account].append(dataset)
+        return Response(projects_by_account(environment, projects, frequency, accounts or None))
 
-        return Response(response)
+    def _statement_version(self, queryset, **aggregates):
+        """
+        The version of a response built from the statements of `queryset`: their latest
+        `updated_at` or that of their projects, which are labelled by name, then the 
+        latest of each, their number and the other `aggregates`
+        """
+        version = queryset.aggregate(
+            updated_at=Max('updated_at'), 
+            projects=Max('sim__project__updated_at'), 
+            count=Count('pk'), 
+            **aggregates,
+        )
+        updated_at = max(filter(None, (version['updated_at'], version['projects'])), default=None)
+        return (updated_at, *version.values())
+
+    def get_version(self):
+        if self.action in ('retrieve', 'income_statement', 'roi'):
+            frequency = self.request.query_params.get('frequency', None)
+            if frequency is not None:
+                # served from the statement of the same simulation at `frequency`, or its block
+                queryset = ProjectStatement.objects \
+                    .filter(sim__projectstatement=self.kwargs['pk'], frequency__in={frequency, '10T'})
+                return (*self._statement_version(queryset, fingerprint=Max('fingerprint')), frequency)
+            # the fingerprint changes with the inputs even if a statement is copied
+            return self._statement_version(
+                ProjectStatement.objects.filter(pk=self.kwargs['pk']), 
+                fingerprint=Max('fingerprint'),
+            )
+        if self.action == 'list':
+            listed = self._statement_version(self.filter_queryset(self.get_queryset()))
+            if not self._resampled_frequencies():
+                return listed
+            blocks = self._statement_version(self._blocks())
+            updated_at = max(filter(None, (listed[0], blocks[0])), default=None)
+            return (updated_at, listed, blocks)
+        if self.action == 'projects_by_account':
+            frequency = self.request.query_params.get('frequency', 'M')
+            return self._statement_version(ProjectStatement.objects.filter(
+                sim__environment=self.request.query_params.get('environment', None),
+                sim__project__in=self.request.GET.getlist('projects[]', None),
+                frequency__in={frequency, '10T'},
+            ))
+        return super().get_version()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('income_statement', 'roi', 'retrieve'):
+            # statements are read through `load_statement`, in byte ranges where possible
+            queryset = queryset.defer('env', 'istat', 'roi')
+        if self.action == 'list':
+            queryset = queryset.select_related('sim__project')
+        return queryset
+
+    def _resampled_frequencies(self):
+        """
+        The frequencies filtered by `frequency` or `frequency__in` that are not saved
+        """
+        params = self.request.query_params
+        requested = [params.get('frequency', ''), *params.get('frequency__in', '').split(',')]
+        return [
+            frequency for frequency in dict.fromkeys(requested)
+            if frequency and frequency != '10T' and frequency not in settings.PERSISTED_FREQUENCIES
+        ]
+
+    def _blocks(self):
+        """
+        The block-level statements of the simulations filtered by `sim` or `sim__in`
+        """
+        blocks = ProjectStatement.objects \
+            .filter(frequency='10T') \
+            .select_related('sim__project') \
+            .defer('env', 'istat', 'roi')
+        params = self.request.query_params
+        if 'sim' in params:
+            blocks = blocks.filter(sim=params['sim'])
+        if 'sim__in' in params:
+            blocks = blocks.filter(sim__in=params['sim__in'].split(','))
+        return blocks
 
-    @action(detail=True, methods=['get'], name='Get Income Statement')
-    def income_statement(self, request, *args, **kwargs):
-        frequency = request.query_params.get('frequency', None)
+    def list(self, request, *args, **kwargs):
+        """
+        Lists the saved statements. The frequencies filtered by `frequency` or `frequency__in`
+        that are not saved are listed as resampled from the block-level statements of the
+        simulations filtered by `sim` or `sim__in`; they have no id.
+        """
+        frequencies = self._resampled_frequencies()
+        if not frequencies:
+            return super().list(request, *args, **kwargs)
+
+        # validates the filters
+        queryset = self.filter_queryset(self.get_queryset())
+
+        fields, omit = self.get_sparse_fields()
+        statements = [name for name in ('env', 'istat', 'roi') if (fields is None or name in fields) and name not in omit]
+        resampled = [
+            resampled_statement(block, frequency) if statements
+            else ProjectStatement(sim=block.sim, frequency=frequency, updated_at=block.updated_at)
+            for block in self._blocks()
+            for frequency in frequencies
+        ]
+
+        serializer = self.get_serializer([*queryset, *resampled], many=True)
+        return Response(serializer.data)
+
+    def get_object(self):
+        """
+        The statement of the url, or with `?frequency=` that of the same simulation at
+        that frequency, resampled from the block-level statement if it is not saved
+        """
+        frequency = self.request.query_params.get('frequency', None)
+        if self.action not in ('retrieve', 'income_statement', 'roi') or frequency is None:
+            return super().get_object()
+
+        # not filtered, or `?frequency=` would apply to the statement of the url
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        stat = get_object_or_404(self.get_queryset(), **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, stat)
+        if frequency != stat.frequency:
+            try:
+                stat = get_statement(stat.sim, frequency)
+            except ProjectStatement.DoesNotExist:
+                raise Http404
+        return stat
+
+    def _streams(self, request):
+        # the browsable API renders the full response; JSON clients are streamed to
+        return request.accepted_renderer.format == 'json'
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self._streams(request) and not is_binary(request):
+            return super().retrieve(request, *args, **kwargs)
 
         stat = self.get_object()
-        serializer = ProjectStatementSerializer(stat, frequency=frequency)
-        
-        data = serializer.data['istat']
+        serializer = self.get_serializer(stat)
+        statements = [name for name in ('env', 'istat', 'roi') if name in serializer.fields]
+        for name in statements:
+            serializer.fields.pop(name)
+
+        fields = dict(serializer.data)
+        if is_binary(request):
+            for name in statements:
+                df = load_statement(stat, name)
+                fields[name] = None if df is None else statement_to_columns(df, stat.frequency, name)
+            return Response(fields)
+
+        for name in statements:
+            fields[name] = iter_statement_json(load_statement(stat, name), stat.frequency, name)
+        return streaming_json_response(iter_object_json(fields))
+
+    def _statement_slice(self, request, statement):
+        """
+        Returns a single statement of the object, restricted by the optional 
+        `accounts[]`, `start` and `end` query parameters. 
         
-        return Response(serializer.data['istat'])
+        The slice is served from the disk cache when it is configured; otherwise
+        only the byte ranges of the requested accounts and periods are read 
+        from the database, where the statement store supports it. JSON responses
+        are streamed as they are encoded; MessagePack and Arrow responses are column-wise.
 
-    @action(detail=True, methods=['get'], name='Get ROI Analysis')
-    def roi(self, request, *args, **kwargs):
-        frequency = request.query_params.get('frequency', None)
+        With `preview=<n>`, each account is instead downsampled to `n` periods for 
+        charting; see `statement_preview`.
+        """
         stat = self.get_object()
-        serializer = ProjectStatementSerializer(stat, frequency=frequency)
-        return Response(serializer.data['roi'])
+        accounts = request.GET.getlist('accounts[]', None)
+        start = request.query_params.get('start', None)
+        end = request.query_params.get('end', None)
+
+        preview = request.query_params.get('preview', None)
+        if preview is not None:
+            n = int(preview) if preview.isdigit() else 0
+            if not 3 <= n <= settings.PREVIEW_MAX_POINTS:
+                return Response(
+                    {'preview': f'Must be an integer from 3 to {settings.PREVIEW_MAX_POINTS}.'}, 
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return Response(statement_preview(stat, statement, n, accounts=accounts or None, start=start, end=end))
+
+        if settings.NORMALIZED_STATEMENTS and stat.pk is not None: # resampled statements are not normalized
+            df = StatementValue.objects.to_frame(
+                stat.sim, stat.frequency, statement, 
+                accounts=accounts, start=start, end=end
+            )
+        else:
+            df = load_statement(stat, statement, accounts=accounts, start=start, end=end)
+
+        if is_binary(request):
+            return Response(None if df is None else statement_to_columns(df, stat.frequency, statement))
+        if self._streams(request):
+            return streaming_json_response(iter_statement_json(df, stat.frequency, statement))
+        if df is None:
+            return Response(None)
+        return Response(statement_to_representation(df, stat.frequency, statement))
+
+    @action(detail=True, methods=['get'], name='Get Income Statement', renderer_classes=NUMERIC_RENDERER_CLASSES)
+    def income_statement(self, request, *args, **kwargs):
+        return self._statement_slice(request, 'istat')
 
-class ProjectStatementSummaryViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'], name='Get ROI Analysis', renderer_classes=NUMERIC_RENDERER_CLASSES)
+    def roi(self, request, *args, **kwargs):
+        return self._statement_slice(request, 'roi')
+
+class ProjectStatementSummaryViewSet(ConditionalGetViewSetMixin, viewsets.ModelViewSet):
     serializer_class = ProjectStatementSummarySerializer
     queryset = ProjectStatementSummary.objects.all()
 
+    def get_version(self):
+        if self.action != 'list':
+            return super().get_version()
+
+        version = ProjectStatementSummary.objects \
+            .filter(
+                sim__environment=self.request.query_params.get('environment', None),
+                sim__project__in=self.request.GET.getlist('projects[]', None),
+            ) \
+            .aggregate(updated_at=Max('updated_at'), projects=Max('sim__project__updated_at'), count=Count('pk'))
+        # projects are labelled by name
+        updated_at = max(filter(None, (version['updated_at'], version['projects'])), default=None)
+        return (updated_at, version['updated_at'], version['count'])
+
     def custom_get_object(self, environment, project):
         sim = ProjectSimulation.objects.get(environment=environment, project=project)
         return ProjectStatementSummary.objects.get(sim=sim)
 
     def list(self, request, *args, **kwargs):
+        """
+        The summaries of `projects[]` in `environment` as one table, read with a 
+        single query; projects without a summary are left out
+        """
         environment = request.query_params.get('environment', None)    
         projects = request.GET.getlist('projects[]', None)
 
-        projects = Project.objects.filter(pk__in=projects)
-        summs = []
-        for project in projects:
-            stat = self.custom_get_object(environment, project)
-            ser = ProjectStatementSummarySerializer(stat)
-            summs.append(ser.data['summary'])
+        summaries = ProjectStatementSummary.objects \
+            .filter(sim__environment=environment, sim__project__in=projects) \
+            .order_by('sim__project_id') \
+            .values_list('sim__project__name', 'summary')
 
-        df = pd.DataFrame(summs).T
-        df.columns = [p.name for p in projects]
-
-        return Response(df.fillna(0).reset_index().to_dict(orient='records'))
+        return Response(summary_records(summaries))
 
 class ProjectsViewSet(viewsets.ModelViewSet):
     serializer_class = ProjectsSerializer
@@ -293,6 +515,12 @@ def get_progress(request, task_id):
     }
     return HttpResponse(json.dumps(response_data))
 
+def get_job_progress(request, job_id):
+    progress = job_progress(job_id)
+    if progress is None:
+        return HttpResponse(json.dumps({'detail': 'Unknown job'}), status=404)
+    return HttpResponse(json.dumps(progress))
+
 # class InListFilter(df.Filter):
 #     """
 #     Expects a comma separated list